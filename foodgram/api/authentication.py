@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+
+def _cache_key(key):
+    return f'auth-token:{key}'
+
+
+def forget_tokens(*keys):
+    """Убирает токены из кеша: при выходе и смене токена."""
+    cache.delete_many([_cache_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кешем соответствия токена
+    и id пользователя.
+
+    Запрос с уже известным токеном не ищет токен в базе, а читает
+    пользователя по первичному ключу. Сам пользователь не кешируется,
+    поэтому права, активность и поля профиля всегда актуальны.
+    Запись живет TOKEN_CACHE_TIMEOUT секунд и сбрасывается сигналами
+    при удалении токена и его замене.
+    """
+
+    def authenticate_credentials(self, key):
+        user_id = cache.get(_cache_key(key))
+        if user_id is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(
+                _cache_key(key), user.pk, settings.TOKEN_CACHE_TIMEOUT
+            )
+            return (user, token)
+        user = get_user_model().objects.filter(pk=user_id).first()
+        if user is None:
+            forget_tokens(key)
+            raise AuthenticationFailed(_('Invalid token.'))
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return (user, self.get_model()(key=key, user=user))
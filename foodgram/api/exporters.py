@@ -0,0 +1,158 @@
+import csv
+from abc import ABC, abstractmethod
+from io import BytesIO
+
+from django.conf import settings
+from django.db.models import F
+from recipes.models import ShoppingListItem
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFError, TTFont
+    from reportlab.pdfgen import canvas
+except ImportError:
+    canvas = None
+
+PDF_FONT_NAME = 'ShoppingCartFont'
+
+
+def shopping_cart_rows(user):
+    """Построчно отдает список покупок пользователя.
+
+    Читает заранее посчитанный сводный список. Запрос выполняется
+    при первом обращении к генератору и читается из базы порциями.
+    """
+    return ShoppingListItem.objects.filter(
+        user=user
+    ).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        total_amount=F('amount'),
+    ).order_by('ingredient__name').iterator()
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingCartRenderer(ABC, BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Сам список отдается потоком через stream(), render() нужен
+    только для ответов с ошибками. Строки читаются из базы, когда
+    сервер уже отдает ответ, то есть после выхода из вьюхи: их запрос
+    не попадает ни в бюджет запросов, ни в метрики действия.
+    """
+    charset = 'utf-8'
+    available = True
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return JSONRenderer().render(data)
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+    def get_filename(self, basename):
+        return f'{basename}.{self.format}'
+
+    @abstractmethod
+    def stream(self, title, rows):
+        """Отдает части файла со списком rows под заголовком title."""
+
+
+class TextShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, title, rows):
+        yield f'{title}\n'
+        for row in rows:
+            yield (
+                f'\n{row["ingredient__name"]} '
+                f'({row["ingredient__measurement_unit"]}) - '
+                f'{row["total_amount"]}'
+            )
+
+
+class CsvShoppingCartRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, title, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('Ингредиент', 'Единица измерения', 'Количество')
+        )
+        for row in rows:
+            yield writer.writerow((
+                row['ingredient__name'],
+                row['ingredient__measurement_unit'],
+                row['total_amount'],
+            ))
+
+
+class PdfShoppingCartRenderer(ShoppingCartRenderer):
+    """Список покупок в PDF.
+
+    reportlab собирает документ целиком, поэтому PDF отдается одним
+    блоком после прохода по строкам. Для кириллицы нужен TTF-шрифт
+    из настройки SHOPPING_CART_PDF_FONT.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_size = 12
+    margin = 50
+
+    @property
+    def available(self):
+        if canvas is None:
+            return False
+        if PDF_FONT_NAME in pdfmetrics.getRegisteredFontNames():
+            return True
+        try:
+            pdfmetrics.registerFont(
+                TTFont(PDF_FONT_NAME, settings.SHOPPING_CART_PDF_FONT)
+            )
+        except (OSError, TTFError):
+            return False
+        return True
+
+    def stream(self, title, rows):
+        buffer = BytesIO()
+        document = canvas.Canvas(buffer, pagesize=A4)
+        width, height = A4
+        line_height = self.font_size * 1.5
+        document.setFont(PDF_FONT_NAME, self.font_size + 2)
+        document.drawString(self.margin, height - self.margin, title)
+        y = height - self.margin - line_height * 2
+        document.setFont(PDF_FONT_NAME, self.font_size)
+        for row in rows:
+            if y < self.margin:
+                document.showPage()
+                document.setFont(PDF_FONT_NAME, self.font_size)
+                y = height - self.margin
+            document.drawString(
+                self.margin, y,
+                f'{row["ingredient__name"]} '
+                f'({row["ingredient__measurement_unit"]}) - '
+                f'{row["total_amount"]}'
+            )
+            y -= line_height
+        document.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_CART_RENDERERS = (
+    TextShoppingCartRenderer,
+    CsvShoppingCartRenderer,
+    PdfShoppingCartRenderer,
+)
@@ -1,32 +1,27 @@
 from django_filters import rest_framework as filters
-from recipes.models import Ingredient, Recipe
-
-
-class IngredientFilter(filters.FilterSet):
-    """Фильтр для сортировки ингридентов."""
-
-    name = filters.CharFilter(field_name="name", lookup_expr="istartswith",)
-
-    class Meta:
-        model = Ingredient
-        fields = ("name",)
+from recipes.models import Recipe, Tag
+from recipes.search import search_recipes
 
 
 class RecipeFilter(filters.FilterSet):
     """Фильтр для сортировки рецептов."""
 
-    tags = filters.AllValuesMultipleFilter(
+    tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
-        lookup_expr='exact',
+        to_field_name='slug',
+        queryset=Tag.objects.all(),
     )
 
     is_favorited = filters.BooleanFilter(method='favorite')
     is_in_shopping_cart = filters.BooleanFilter(
         method='shopping_cart')
+    search = filters.CharFilter(method='full_text_search')
 
     class Meta:
         model = Recipe
-        fields = ("tags", "author", "is_favorited", "is_in_shopping_cart")
+        fields = (
+            "tags", "author", "is_favorited", "is_in_shopping_cart", "search"
+        )
 
     def favorite(self, queryset, name, value):
         user = self.request.user
@@ -39,3 +34,6 @@ class RecipeFilter(filters.FilterSet):
         if value:
             return queryset.filter(shopping_cart__user=user)
         return Recipe.objects.all()
+
+    def full_text_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
@@ -0,0 +1,394 @@
+import base64
+import io
+import json
+import os
+import tempfile
+import tracemalloc
+from itertools import count
+from statistics import median
+from time import perf_counter
+
+from api.exporters import PdfShoppingCartRenderer
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from PIL import Image
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.versions import INGREDIENTS, TAGS, bump_data_version
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))),
+    'benchmark_baseline.json'
+)
+RECIPE_QUERY = 'суп'
+INGREDIENT_QUERY = 'мол'
+INGREDIENT_FUZZY_QUERY = 'малоко'
+# Страница, которую меряет маршрут recipes_list_cursor_deep.
+CURSOR_DEPTH = 50
+CURSOR_PAGE_SIZE = 20
+# Допустимый разброс времени в миллисекундах поверх относительного.
+LATENCY_SLACK_MS = 2.0
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет маршруты API на тестовой базе с синтетическими данными '
+        'и сравнивает число запросов, задержку и память с базовой линией'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.5,
+            help='Допустимый относительный рост задержки и памяти',
+        )
+        parser.add_argument(
+            '--baseline',
+            default=BASELINE_PATH,
+            help='Файл с базовой линией',
+        )
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help='Записать результаты как новую базовую линию',
+        )
+
+    def handle(self, *args, **options):
+        dataset = {
+            key: options[key]
+            for key in ('users', 'recipes', 'seed')
+        }
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        media_root = tempfile.TemporaryDirectory()
+        try:
+            with override_settings(
+                QUERY_BUDGET_CHECK='strict', MEDIA_ROOT=media_root.name
+            ):
+                fixtures = self.seed(dataset)
+                results = {
+                    name: self.measure(request, options['iterations'])
+                    for name, request in self.routes(fixtures)
+                }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            media_root.cleanup()
+        self.report(results)
+        if options['update_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as file:
+                json.dump(
+                    {'dataset': dataset, 'routes': results},
+                    file,
+                    indent=2,
+                    sort_keys=True,
+                )
+                file.write('\n')
+            self.stdout.write(
+                f'Базовая линия записана в {options["baseline"]}'
+            )
+            return
+        self.compare(results, dataset, options)
+
+    def seed(self, dataset):
+        """Заполняет тестовую базу и возвращает объекты для запросов."""
+        quiet = io.StringIO()
+        call_command('import_ingredients', stdout=quiet)
+        call_command(
+            'generate_fake_data',
+            users=dataset['users'],
+            recipes=dataset['recipes'],
+            seed=dataset['seed'],
+            stdout=quiet,
+        )
+        bump_data_version(INGREDIENTS)
+        bump_data_version(TAGS)
+        user = User.objects.order_by('id').first()
+        return {
+            'token': Token.objects.create(user=user).key,
+            'recipes': list(Recipe.objects.exclude(
+                favorites__user=user
+            ).exclude(shopping_cart__user=user).values_list(
+                'id', flat=True
+            )[:8]),
+            'author': user.subscriptions.values_list(
+                'author_id', flat=True
+            )[0],
+            'unfollowed': User.objects.exclude(pk=user.pk).exclude(
+                subscribers__subscriber=user
+            ).values_list('id', flat=True)[0],
+            'tags': list(Tag.objects.values_list('slug', flat=True)[:2]),
+            'tag_ids': list(Tag.objects.values_list('id', flat=True)[:2]),
+            'ingredient_ids': list(
+                Ingredient.objects.values_list('id', flat=True)[:10]
+            ),
+        }
+
+    @staticmethod
+    def recipe_payload(fixtures, name):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 48), (200, 120, 40)).save(buffer, 'PNG')
+        return {
+            'name': name,
+            'text': 'Рецепт для замера',
+            'cooking_time': 15,
+            'image': 'data:image/png;base64,' + base64.b64encode(
+                buffer.getvalue()
+            ).decode(),
+            'tags': fixtures['tag_ids'],
+            'ingredients': [
+                {'id': ingredient_id, 'amount': 100}
+                for ingredient_id in fixtures['ingredient_ids']
+            ],
+        }
+
+    @staticmethod
+    def deep_cursor_url(client):
+        """Проходит список рецептов по курсору до конца и возвращает
+        адрес страницы CURSOR_DEPTH. Если страницы теряют или повторяют
+        рецепты, замер не имеет смысла."""
+        url = '/api/recipes/'
+        data = {'cursor': '', 'limit': CURSOR_PAGE_SIZE}
+        seen = []
+        deep_url = None
+        for page in count(1):
+            response = client.get(url, data)
+            seen.extend(recipe['id'] for recipe in response.data['results'])
+            url, data = response.data['next'], None
+            if page == CURSOR_DEPTH:
+                deep_url = url
+            if url is None:
+                break
+        expected = set(Recipe.objects.values_list('id', flat=True))
+        if len(seen) != len(set(seen)) or set(seen) != expected:
+            raise CommandError(
+                f'Курсор отдал {len(set(seen))} рецептов из {len(expected)} '
+                f'и {len(seen) - len(set(seen))} повторов.'
+            )
+        if deep_url is None:
+            raise CommandError(
+                f'В списке меньше {CURSOR_DEPTH + 1} страниц по курсору.'
+            )
+        return deep_url
+
+    def routes(self, fixtures):
+        """Пары (имя маршрута, функция одного запроса)."""
+        anonymous = APIClient()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {fixtures["token"]}')
+        recipe_url = f'/api/recipes/{fixtures["recipes"][0]}/'
+        menu = {'recipes': fixtures['recipes'][1:]}
+        names = (f'Замер {number}' for number in count())
+        own_recipe = client.post(
+            '/api/recipes/',
+            self.recipe_payload(fixtures, next(names)),
+            format='json'
+        ).data['id']
+
+        def get(client, url, data=None):
+            return lambda: client.get(url, data)
+
+        def toggle(url, data=None):
+            state = {'added': False}
+
+            def request():
+                method = client.delete if state['added'] else client.post
+                state['added'] = not state['added']
+                return method(url, data, format='json')
+            return request
+
+        def create_recipe():
+            return client.post(
+                '/api/recipes/',
+                self.recipe_payload(fixtures, next(names)),
+                format='json'
+            )
+
+        edit = self.recipe_payload(fixtures, 'Правка')
+        del edit['image']
+        amounts = count()
+
+        def edit_recipe():
+            # Каждая правка меняет количество одного ингредиента.
+            edit['ingredients'][0]['amount'] = 100 + next(amounts) % 2
+            return client.patch(
+                f'/api/recipes/{own_recipe}/', edit, format='json'
+            )
+
+        routes = (
+            ('recipes_list_anonymous', get(anonymous, '/api/recipes/')),
+            ('recipes_list', get(client, '/api/recipes/')),
+            ('recipes_list_cursor', get(
+                client, '/api/recipes/', {'cursor': ''}
+            )),
+            ('recipes_list_cursor_deep', get(
+                client, self.deep_cursor_url(client)
+            )),
+            ('recipes_filter_tags', get(
+                client, '/api/recipes/', {'tags': fixtures['tags']}
+            )),
+            ('recipes_filter_author', get(
+                client, '/api/recipes/', {'author': fixtures['author']}
+            )),
+            ('recipes_filter_favorited', get(
+                client, '/api/recipes/', {'is_favorited': 1}
+            )),
+            ('recipes_filter_in_cart', get(
+                client, '/api/recipes/', {'is_in_shopping_cart': 1}
+            )),
+            ('recipes_search', get(
+                client, '/api/recipes/', {'search': RECIPE_QUERY}
+            )),
+            ('recipe_detail', get(client, recipe_url)),
+            ('recipe_similar', get(client, f'{recipe_url}similar/')),
+            ('ingredients_search', get(
+                client, '/api/ingredients/', {'name': INGREDIENT_QUERY}
+            )),
+            ('ingredients_search_fuzzy', get(
+                client, '/api/ingredients/',
+                {'name': INGREDIENT_FUZZY_QUERY, 'fuzzy': 'true'}
+            )),
+            ('tags_list', get(client, '/api/tags/')),
+            ('users_list', get(client, '/api/users/')),
+            ('users_me', get(client, '/api/users/me/')),
+            ('feed', get(client, '/api/recipes/feed/')),
+            ('subscriptions', get(
+                client, '/api/users/subscriptions/', {'recipes_limit': 3}
+            )),
+            ('subscribe_toggle', toggle(
+                f'/api/users/{fixtures["unfollowed"]}/subscribe/'
+            )),
+            ('favorite_toggle', toggle(f'{recipe_url}favorite/')),
+            ('shopping_cart_toggle', toggle(f'{recipe_url}shopping_cart/')),
+            ('shopping_cart_batch_toggle', toggle(
+                '/api/recipes/shopping_cart/', menu
+            )),
+            ('download_shopping_cart_txt', get(
+                client, '/api/recipes/download_shopping_cart/',
+                {'format': 'txt'}
+            )),
+            ('download_shopping_cart_csv', get(
+                client, '/api/recipes/download_shopping_cart/',
+                {'format': 'csv'}
+            )),
+            ('download_shopping_cart_pdf', get(
+                client, '/api/recipes/download_shopping_cart/',
+                {'format': 'pdf'}
+            )),
+            ('recipe_create', create_recipe),
+            ('recipe_edit', edit_recipe),
+        )
+        if not PdfShoppingCartRenderer().available:
+            self.stdout.write(
+                'download_shopping_cart_pdf: PDF недоступен, маршрут пропущен'
+            )
+            routes = tuple(
+                route for route in routes
+                if route[0] != 'download_shopping_cart_pdf'
+            )
+        return routes
+
+    def measure(self, request, iterations):
+        """Число запросов, задержка и пик памяти одного маршрута."""
+
+        def run():
+            response = request()
+            if response.status_code >= 400:
+                raise CommandError(
+                    f'{response.status_code}: {response.content[:200]}'
+                )
+            if response.streaming:
+                b''.join(response.streaming_content)
+
+        run()
+        run()
+        with CaptureQueriesContext(connection) as context:
+            run()
+        queries = len(context.captured_queries)
+        timings = []
+        for _ in range(iterations):
+            started = perf_counter()
+            run()
+            timings.append((perf_counter() - started) * 1000)
+        timings.sort()
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return {
+            'queries': queries,
+            'p50_ms': round(median(timings), 2),
+            'p99_ms': round(timings[max(int(len(timings) * 0.99) - 1, 0)], 2),
+            'peak_kb': round(peak / 1024),
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"маршрут":<30}{"запросы":>8}{"p50, мс":>10}'
+            f'{"p99, мс":>10}{"память, КБ":>12}'
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f'{name:<30}{result["queries"]:>8}{result["p50_ms"]:>10}'
+                f'{result["p99_ms"]:>10}{result["peak_kb"]:>12}'
+            )
+
+    @staticmethod
+    def regressions(name, result, expected, tolerance):
+        if result['queries'] > expected['queries']:
+            yield (
+                f'{name}: запросов {result["queries"]} '
+                f'вместо {expected["queries"]}'
+            )
+        for key in ('p50_ms', 'p99_ms'):
+            limit = expected[key] * tolerance + LATENCY_SLACK_MS
+            if result[key] > limit:
+                yield f'{name}: {key} {result[key]} при пределе {limit:.2f}'
+        limit = expected['peak_kb'] * tolerance
+        if result['peak_kb'] > limit:
+            yield (
+                f'{name}: память {result["peak_kb"]} КБ '
+                f'при пределе {limit:.0f} КБ'
+            )
+
+    def compare(self, results, dataset, options):
+        try:
+            with open(options['baseline'], encoding='utf-8') as file:
+                baseline = json.load(file)
+        except FileNotFoundError:
+            raise CommandError(
+                'Базовой линии нет, запустите команду с --update-baseline.'
+            )
+        if baseline['dataset'] != dataset:
+            raise CommandError(
+                f'Базовая линия снята на других данных: {baseline["dataset"]}'
+            )
+        regressions = []
+        for name, result in results.items():
+            expected = baseline['routes'].get(name)
+            if expected is None:
+                self.stdout.write(f'{name}: нет в базовой линии')
+                continue
+            regressions.extend(self.regressions(
+                name, result, expected, 1 + options['tolerance']
+            ))
+        for regression in regressions:
+            self.stdout.write(regression)
+        if regressions:
+            raise CommandError(f'Регрессий: {len(regressions)}')
+        self.stdout.write('Регрессий нет.')
@@ -0,0 +1,239 @@
+import atexit
+import json
+import os
+import tempfile
+import threading
+from collections import Counter, defaultdict
+from time import monotonic, perf_counter
+
+from django.conf import settings
+from django.db import connection
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+# Границы корзин гистограммы времени ответа, в секундах.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+METRIC_PREFIX = 'foodgram'
+
+
+class QueryTimer:
+    """Обертка выполнения SQL: считает запросы и время в базе."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += perf_counter() - started
+
+
+class Metrics:
+    """Метрики запросов одного процесса.
+
+    Счетчики копятся в памяти под блокировкой и не реже раза в
+    METRICS_FLUSH_INTERVAL секунд сбрасываются в файл процесса в каталоге
+    METRICS_DIR. Экспорт суммирует файлы всех процессов, поэтому
+    воркеры gunicorn видны как одно приложение.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flushed = monotonic()
+        self._requests = Counter()
+        self._buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+        self._durations = Counter()
+        self._queries = Counter()
+        self._db_seconds = Counter()
+
+    @property
+    def path(self):
+        return os.path.join(settings.METRICS_DIR, f'{os.getpid()}.json')
+
+    def record(self, view, method, status, seconds, queries, db_seconds):
+        with self._lock:
+            self._requests[(view, method, str(status))] += 1
+            buckets = self._buckets[view]
+            for position, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[position] += 1
+            self._durations[view] += seconds
+            self._queries[view] += queries
+            self._db_seconds[view] += db_seconds
+            elapsed = monotonic() - self._flushed
+        if elapsed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'requests': [
+                    [*labels, count]
+                    for labels, count in self._requests.items()
+                ],
+                'buckets': dict(self._buckets),
+                'durations': dict(self._durations),
+                'queries': dict(self._queries),
+                'db_seconds': dict(self._db_seconds),
+            }
+
+    def flush(self):
+        """Атомарно переписывает файл процесса текущими значениями."""
+        snapshot = self.snapshot()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        descriptor, temporary = tempfile.mkstemp(
+            dir=settings.METRICS_DIR, suffix='.tmp'
+        )
+        with os.fdopen(descriptor, 'w') as file:
+            json.dump(snapshot, file)
+        os.replace(temporary, self.path)
+        self._flushed = monotonic()
+
+    def collect(self):
+        """Сумма метрик всех процессов, писавших в METRICS_DIR."""
+        self.flush()
+        total = {
+            'requests': Counter(),
+            'buckets': defaultdict(lambda: [0] * len(LATENCY_BUCKETS)),
+            'durations': Counter(),
+            'queries': Counter(),
+            'db_seconds': Counter(),
+        }
+        for name in os.listdir(settings.METRICS_DIR):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(settings.METRICS_DIR, name)) as file:
+                    snapshot = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for *labels, count in snapshot['requests']:
+                total['requests'][tuple(labels)] += count
+            for view, buckets in snapshot['buckets'].items():
+                total['buckets'][view] = [
+                    left + right
+                    for left, right in zip(total['buckets'][view], buckets)
+                ]
+            for key in ('durations', 'queries', 'db_seconds'):
+                total[key].update(snapshot[key])
+        return total
+
+
+metrics = Metrics()
+atexit.register(metrics.flush)
+
+
+def view_label(view_func, method):
+    """Имя действия для меток: RecipeViewSet.list, MetricsView и т.п."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    actions = getattr(view_func, 'actions', None)
+    if actions:
+        action = actions.get(method.lower())
+        if action:
+            return f'{cls.__name__}.{action}'
+    return cls.__name__
+
+
+class MetricsMiddleware:
+    """Считает запросы, время ответа, число SQL-запросов и время
+    в базе для каждого действия API."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        view = getattr(request, 'metrics_view', None)
+        if view is not None:
+            metrics.record(
+                view,
+                request.method,
+                response.status_code,
+                perf_counter() - started,
+                timer.count,
+                timer.seconds,
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_view = view_label(view_func, request.method)
+
+
+class PrometheusRenderer(BaseRenderer):
+    """Текстовый формат экспозиции Prometheus."""
+    media_type = 'text/plain'
+    format = 'prometheus'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if not isinstance(data, dict) or 'requests' not in data:
+            return JSONRenderer().render(data)
+        lines = []
+
+        def family(name, kind, description):
+            lines.append(f'# HELP {METRIC_PREFIX}_{name} {description}')
+            lines.append(f'# TYPE {METRIC_PREFIX}_{name} {kind}')
+
+        def sample(name, labels, value):
+            rendered = ','.join(
+                '{}="{}"'.format(key, str(label).replace('"', '\\"'))
+                for key, label in labels
+            )
+            lines.append(f'{METRIC_PREFIX}_{name}{{{rendered}}} {value}')
+
+        family('http_requests_total', 'counter', 'Requests by API action.')
+        for (view, method, status), count in sorted(data['requests'].items()):
+            sample(
+                'http_requests_total',
+                (('view', view), ('method', method), ('status', status)),
+                count
+            )
+        family(
+            'http_request_duration_seconds', 'histogram',
+            'Response time by API action.'
+        )
+        for view, buckets in sorted(data['buckets'].items()):
+            count = sum(
+                total for (label, _, _), total in data['requests'].items()
+                if label == view
+            )
+            for bound, total in zip(LATENCY_BUCKETS, buckets):
+                sample(
+                    'http_request_duration_seconds_bucket',
+                    (('view', view), ('le', bound)),
+                    total
+                )
+            sample(
+                'http_request_duration_seconds_bucket',
+                (('view', view), ('le', '+Inf')),
+                count
+            )
+            sample(
+                'http_request_duration_seconds_sum', (('view', view),),
+                round(data['durations'][view], 6)
+            )
+            sample(
+                'http_request_duration_seconds_count', (('view', view),),
+                count
+            )
+        family('db_queries_total', 'counter', 'SQL queries by API action.')
+        for view, count in sorted(data['queries'].items()):
+            sample('db_queries_total', (('view', view),), count)
+        family(
+            'db_query_duration_seconds_total', 'counter',
+            'Time spent in SQL by API action.'
+        )
+        for view, seconds in sorted(data['db_seconds'].items()):
+            sample(
+                'db_query_duration_seconds_total', (('view', view),),
+                round(seconds, 6)
+            )
+        return ('\n'.join(lines) + '\n').encode(self.charset)
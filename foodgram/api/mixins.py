@@ -0,0 +1,88 @@
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.cache import get_conditional_response
+from recipes.versions import get_data_version
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetError(Exception):
+    """Действие выполнило больше SQL-запросов, чем допускает бюджет."""
+
+
+class QueryBudgetMixin:
+    """Контроль числа SQL-запросов на действие вьюсета.
+
+    Бюджет задается словарем query_budget {действие: число запросов}.
+    Проверка включается настройкой QUERY_BUDGET_CHECK: значение 'warn'
+    пишет предупреждение в лог, 'strict' вызывает исключение.
+    """
+    query_budget = {}
+
+    def dispatch(self, request, *args, **kwargs):
+        mode = getattr(settings, 'QUERY_BUDGET_CHECK', None)
+        if not mode:
+            return super().dispatch(request, *args, **kwargs)
+        with CaptureQueriesContext(connection) as queries:
+            response = super().dispatch(request, *args, **kwargs)
+        budget = self.query_budget.get(getattr(self, 'action', None))
+        if budget is not None and len(queries) > budget:
+            message = (
+                f'{type(self).__name__}.{self.action}: '
+                f'{len(queries)} SQL-запросов при бюджете {budget}'
+            )
+            if mode == 'strict':
+                raise QueryBudgetError(message)
+            logger.warning(message)
+        return response
+
+
+class DataVersionCacheMixin:
+    """Кеширование ответов справочника по версии его данных.
+
+    Версия data_version_name меняется сигналами при сохранении
+    и удалении записей. Ответы list и retrieve кешируются с ключом
+    из версии и адреса запроса, ETag строится по той же версии,
+    поэтому повторный запрос с If-None-Match получает 304.
+    Last-Modified не отдается: с точностью до секунды он пропустил бы
+    изменения в ту же секунду.
+    """
+    data_version_name = None
+    response_cache_timeout = 60 * 60 * 24
+
+    def versioned_response(self, handler, request, *args, **kwargs):
+        version = get_data_version(self.data_version_name)
+        etag = '"{}"'.format(hashlib.md5(
+            f'{version}:{request.get_full_path()}:'
+            f'{request.accepted_renderer.format}'.encode()
+        ).hexdigest())
+        response = get_conditional_response(request._request, etag=etag)
+        if response is None:
+            key = f'response:{self.data_version_name}:{etag}'
+            data = cache.get(key)
+            if data is None:
+                response = handler(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                cache.set(key, response.data, self.response_cache_timeout)
+            else:
+                response = Response(data)
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.versioned_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.versioned_response(
+            super().retrieve, request, *args, **kwargs
+        )
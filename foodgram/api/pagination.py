@@ -1,6 +1,153 @@
+import base64
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Кодирует дату и время с микросекундами: DjangoJSONEncoder
+    отбрасывает их до миллисекунд, и курсор пропускал бы строки
+    из той же миллисекунды."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
 
 
 class LimitPagination(PageNumberPagination):
     page_size_query_param = 'limit'
     page_size = 6
+
+
+class KeysetPagination(LimitPagination):
+    """Пагинация по ключу сортировки с переходом на номерную.
+
+    Включается параметром cursor (пустым для первой страницы).
+    Страница выбирается условием по полям keyset_ordering вьюсета,
+    без OFFSET, а общее число объектов считается только при count=true.
+    Без параметра cursor работает как LimitPagination, если не задан
+    keyset_required. Так же она работает, если в запросе есть параметр
+    из keyset_disabled_by вьюсета: например, результаты поиска
+    упорядочены по релевантности, а не по ключу.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Неверный курсор.'
+    keyset_ordering = None
+    keyset_required = False
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.use_keyset(request, view)
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.ordering = self.keyset_ordering or view.keyset_ordering
+        self.count = None
+        if request.query_params.get(self.count_query_param) in (
+            '1', 'true', 'True'
+        ):
+            self.count = queryset.count()
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(
+                self.after(self.decode(cursor, queryset.model))
+            )
+        page_size = self.get_page_size(request)
+        page = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode([
+                getattr(page[-1], field.lstrip('-'))
+                for field in self.ordering
+            ])
+        return page
+
+    def use_keyset(self, request, view):
+        if any(
+            param in request.query_params
+            for param in getattr(view, 'keyset_disabled_by', ())
+        ):
+            return False
+        return (
+            self.keyset_required
+            or self.cursor_query_param in request.query_params
+        )
+
+    def after(self, values):
+        """Условие "строго после" для ключа values в порядке ordering."""
+        condition = Q()
+        for position, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {
+                previous.lstrip('-'): value
+                for previous, value in zip(
+                    self.ordering[:position], values[:position]
+                )
+            }
+            condition |= Q(**equal, **{f'{name}__{lookup}': values[position]})
+        return condition
+
+    def encode(self, values):
+        return base64.urlsafe_b64encode(
+            json.dumps(values, cls=CursorEncoder).encode()
+        ).decode()
+
+    def decode(self, cursor, model):
+        """Значения ключа из курсора, приведенные к типам полей model."""
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            values = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, values)
+            ]
+        except (ValidationError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if None in values:
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            remove_query_param(url, self.page_query_param),
+            self.cursor_query_param,
+            self.next_cursor
+        )
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = None
+        response['results'] = data
+        return Response(response)
+
+
+class TimelinePagination(KeysetPagination):
+    """Лента подписок листается только по ключу."""
+    keyset_ordering = ('-pub_date', '-recipe_id')
+    keyset_required = True
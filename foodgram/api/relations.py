@@ -0,0 +1,75 @@
+from django.db.models import Exists, OuterRef
+from django.utils.functional import cached_property
+from recipes.models import Favorite, Recipe, ShoppingСart
+from users.models import Subscription
+
+
+class UserRelations:
+    """Связи текущего пользователя: избранное, корзина и подписки.
+
+    Каждый набор id загружается одним запросом при первом обращении,
+    дальше сериализаторы проверяют принадлежность в памяти.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    def _load_ids(self, model, user_field, field):
+        if not self.user.is_authenticated:
+            return frozenset()
+        return frozenset(
+            model.objects.filter(
+                **{user_field: self.user}
+            ).values_list(field, flat=True)
+        )
+
+    def load_for_recipe(self, recipe):
+        """Заполняет наборы одним запросом только для recipe и его автора.
+
+        Подходит для ответов, где сериализуется один рецепт: наборы
+        ничего не знают о других рецептах и авторах.
+        """
+        favorited, in_shopping_cart, subscribed = Recipe.objects.filter(
+            pk=recipe.pk
+        ).annotate(
+            favorited=Exists(Favorite.objects.filter(
+                user=self.user, recipe=OuterRef('pk')
+            )),
+            in_shopping_cart=Exists(ShoppingСart.objects.filter(
+                user=self.user, recipe=OuterRef('pk')
+            )),
+            subscribed=Exists(Subscription.objects.filter(
+                subscriber=self.user, author=OuterRef('author')
+            )),
+        ).values_list('favorited', 'in_shopping_cart', 'subscribed').get()
+        self.__dict__.update(
+            favorite_ids=frozenset([recipe.pk] if favorited else []),
+            shopping_cart_ids=frozenset(
+                [recipe.pk] if in_shopping_cart else []
+            ),
+            subscribed_author_ids=frozenset(
+                [recipe.author_id] if subscribed else []
+            ),
+        )
+
+    @cached_property
+    def favorite_ids(self):
+        return self._load_ids(Favorite, 'user', 'recipe_id')
+
+    @cached_property
+    def shopping_cart_ids(self):
+        return self._load_ids(ShoppingСart, 'user', 'recipe_id')
+
+    @cached_property
+    def subscribed_author_ids(self):
+        return self._load_ids(Subscription, 'subscriber', 'author_id')
+
+
+def get_user_relations(context):
+    """Возвращает общий для всего запроса экземпляр UserRelations."""
+    request = context.get('request')
+    relations = getattr(request, '_user_relations', None)
+    if relations is None:
+        relations = UserRelations(request.user)
+        request._user_relations = relations
+    return relations
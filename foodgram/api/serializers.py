@@ -2,28 +2,60 @@ import base64
 
 from django.core.files.base import ContentFile
 from django.db import transaction
-from django.shortcuts import get_object_or_404
 from djoser.serializers import UserCreateSerializer, UserSerializer
+from recipes.images import check_image_header, variant_urls
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingСart, Tag)
+                            ShoppingListItem, Tag)
+from recipes.tasks import schedule_image_processing, schedule_similarity_update
 from rest_framework import serializers
 from rest_framework.validators import UniqueTogetherValidator, ValidationError
-from users.models import Subscription, User
+from users.models import User
+
+from .relations import get_user_relations
 
 
 class Base64ImageField(serializers.ImageField):
-    """Кастомное поле для кодирования изображений в base64."""
+    """Кастомное поле для кодирования изображений в base64.
+
+    В запросе проверяется только заголовок изображения, а разбор,
+    поворот по EXIF и уменьшение выполняет фоновая задача
+    recipes.process_image.
+    """
+    allowed_extensions = ('jpeg', 'jpg', 'png', 'gif', 'webp')
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
+            try:
+                format, imgstr = data.split(';base64,')
+                content = base64.b64decode(imgstr)
+                check_image_header(content)
+            except ValueError:
+                self.fail('invalid_image')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            if ext not in self.allowed_extensions:
+                self.fail('invalid_image')
+            data = ContentFile(content, name='temp.' + ext)
+            return serializers.FileField.to_internal_value(self, data)
         return super().to_internal_value(data)
 
     def to_representation(self, value):
         return value.url
 
 
+class ImageVariantsField(serializers.Field):
+    """Адреса уменьшенных копий фото рецепта."""
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return variant_urls(
+            recipe.image, ready=recipe.image_status == Recipe.IMAGE_READY
+        )
+
+
 class CustomUserCreateSerializer(UserCreateSerializer):
     """Cериализатор для создания пользователей."""
 
@@ -55,12 +87,8 @@ class CustomUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        user = self.context.get('request').user
-        is_subscribed = (
-            user.is_authenticated and Subscription.objects.filter(
-                subscriber=user, author=obj).exists()
-        )
-        return is_subscribed
+        relations = get_user_relations(self.context)
+        return obj.id in relations.subscribed_author_ids
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -97,10 +125,11 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 
 class IngredientShortSerializer(serializers.ModelSerializer):
-    """Сериализатор добавления ингредиентов при создании рецепта."""
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),
-        source='ingredient')
+    """Сериализатор добавления ингредиентов при создании рецепта.
+    Существование ингредиентов проверяет CreateRecipeSerializer
+    одним запросом на весь список.
+    """
+    id = serializers.IntegerField(source='ingredient_id')
 
     class Meta:
         model = RecipeIngredient
@@ -113,10 +142,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         read_only=True,
         default=serializers.CurrentUserDefault()
     )
-    tags = serializers.PrimaryKeyRelatedField(
-        queryset=Tag.objects.all(),
-        many=True
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = IngredientShortSerializer(many=True)
     image = Base64ImageField(use_url=True, max_length=None)
 
@@ -140,6 +166,34 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             )
         ]
 
+    def validate_tags(self, tag_ids):
+        tags = Tag.objects.in_bulk(tag_ids)
+        missing = set(tag_ids) - tags.keys()
+        if missing:
+            raise ValidationError(
+                'Теги не найдены: {}'.format(
+                    ', '.join(map(str, sorted(missing)))
+                )
+            )
+        return [tags[tag_id] for tag_id in tag_ids]
+
+    def validate_ingredients(self, ingredients):
+        found = Ingredient.objects.in_bulk({
+            ingredient['ingredient_id'] for ingredient in ingredients
+        })
+        missing = {
+            ingredient['ingredient_id'] for ingredient in ingredients
+        } - found.keys()
+        if missing:
+            raise ValidationError(
+                'Ингредиенты не найдены: {}'.format(
+                    ', '.join(map(str, sorted(missing)))
+                )
+            )
+        for ingredient in ingredients:
+            ingredient['ingredient'] = found[ingredient['ingredient_id']]
+        return ingredients
+
     def validate(self, data):
         """Валидиация ингредиентов и тегов."""
         ingredients = self.initial_data.get('ingredients')
@@ -148,7 +202,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             raise ValidationError(
                 'Нельзя создать рецепт без ингредиентов!'
             )
-        recipe_ingredients = [i['ingredient'] for i in data['ingredients']]
+        recipe_ingredients = [i['ingredient_id'] for i in data['ingredients']]
         if len(recipe_ingredients) > len(set(recipe_ingredients)):
             raise ValidationError(
                 'Ингредиенты в рецепте не должны повторяться!'
@@ -171,28 +225,91 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(author=author, **validated_data)
         recipe.tags.set(tags)
         self.recipe_ingredients(recipe, ingredients)
+        schedule_image_processing(recipe)
+        schedule_similarity_update(recipe)
         return recipe
 
     @transaction.atomic
     def update(self, recipe, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
-        RecipeIngredient.objects.filter(recipe=recipe).delete()
         recipe.tags.set(tags)
-        self.recipe_ingredients(recipe, ingredients)
-        return super().update(recipe, validated_data)
+        old_amounts, new_amounts = self.update_recipe_ingredients(
+            recipe, ingredients
+        )
+        ShoppingListItem.objects.change_recipe(
+            recipe, old_amounts, new_amounts
+        )
+        if old_amounts.keys() != new_amounts.keys():
+            schedule_similarity_update(recipe)
+        recipe = super().update(recipe, validated_data)
+        if 'image' in validated_data:
+            schedule_image_processing(recipe)
+        return recipe
 
     def recipe_ingredients(self, recipe, ingredients):
         recipe_ingredients = [RecipeIngredient(
             recipe=recipe,
-            ingredient=ingredient.get('ingredient'),
+            ingredient_id=ingredient.get('ingredient_id'),
             amount=ingredient.get('amount')
         ) for ingredient in ingredients]
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
 
+    def update_recipe_ingredients(self, recipe, ingredients):
+        """Применяет к рецепту только изменившиеся ингредиенты.
+
+        Новые строки вставляются, строки с другим количеством
+        обновляются, пропавшие удаляются, остальные не трогаются.
+        Возвращает прежние и новые количества {ingredient_id: amount}.
+        """
+        current = {
+            ingredient_id: (pk, amount)
+            for pk, ingredient_id, amount in RecipeIngredient.objects.filter(
+                recipe=recipe
+            ).values_list('id', 'ingredient_id', 'amount')
+        }
+        new_amounts = {
+            ingredient['ingredient_id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        RecipeIngredient.objects.filter(pk__in=[
+            pk for ingredient_id, (pk, _) in current.items()
+            if ingredient_id not in new_amounts
+        ]).delete()
+        RecipeIngredient.objects.bulk_update([
+            RecipeIngredient(pk=current[ingredient_id][0], amount=amount)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id in current
+            and current[ingredient_id][1] != amount
+        ], ['amount'])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in current
+        ])
+        old_amounts = {
+            ingredient_id: amount
+            for ingredient_id, (_, amount) in current.items()
+        }
+        return old_amounts, new_amounts
+
     def to_representation(self, instance):
+        """Ответ собирается из уже проверенных тегов и ингредиентов,
+        рецепт после записи не перечитывается."""
         context = {'request': self.context.get('request')}
-        return RecipeSerializer(instance, context=context).data
+        instance.saved_tags = self.validated_data['tags']
+        instance.saved_ingredients = [
+            RecipeIngredient(
+                recipe=instance,
+                ingredient=ingredient['ingredient'],
+                amount=ingredient['amount']
+            )
+            for ingredient in self.validated_data['ingredients']
+        ]
+        get_user_relations(context).load_for_recipe(instance)
+        return SavedRecipeSerializer(instance, context=context).data
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -205,6 +322,7 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     author = CustomUserSerializer(read_only=True)
     image = Base64ImageField(use_url=True, max_length=None)
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -217,6 +335,8 @@ class RecipeSerializer(serializers.ModelSerializer):
             'ingredients',
             'name',
             'image',
+            'image_variants',
+            'image_status',
             'text',
             'cooking_time',
             'is_favorited',
@@ -224,33 +344,45 @@ class RecipeSerializer(serializers.ModelSerializer):
         )
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        is_favorited = (
-            user.is_authenticated and Favorite.objects.filter(
-                user=user, recipe=obj).exists()
-        )
-        return is_favorited
+        return obj.id in get_user_relations(self.context).favorite_ids
 
     def get_is_in_shopping_cart(self, obj):
-        user = self.context.get('request').user
-        is_favorited = (
-            user.is_authenticated and ShoppingСart.objects.filter(
-                user=user, recipe=obj).exists()
-        )
-        return is_favorited
+        return obj.id in get_user_relations(self.context).shopping_cart_ids
+
+
+class SavedRecipeSerializer(RecipeSerializer):
+    """Ответ на запись рецепта: теги и ингредиенты берутся
+    из проверенных данных запроса, а не перечитываются из базы."""
+    tags = TagSerializer(source='saved_tags', many=True, read_only=True)
+    ingredients = RecipeIngredientSerializer(
+        source='saved_ingredients',
+        many=True,
+        read_only=True
+    )
 
 
 class SubscriptionShortSerializer(serializers.ModelSerializer):
     """Сериализатор отображения рецептов в подписке."""
+    image = Base64ImageField(read_only=True)
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ("id", "name", "image", "cooking_time")
+        fields = ("id", "name", "image", "image_variants", "cooking_time")
 
 
 class SubscriptionSerializer(serializers.ModelSerializer):
-    """Сериализатор отображения подписок."""
-    recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    """Сериализатор отображения подписок.
+
+    Ожидает авторов с предзагруженными в limited_recipes
+    последними рецептами.
+    """
+    recipes = SubscriptionShortSerializer(
+        source='limited_recipes',
+        many=True,
+        read_only=True
+    )
+    recipes_count = serializers.IntegerField(read_only=True)
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -266,51 +398,18 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             'recipes_count'
         )
 
-    def get_recipes(self, obj):
-        recipes = obj.recipes.all()
-        return SubscriptionShortSerializer(recipes, many=True).data
-
-    def get_recipes_count(self, obj):
-        recipes = Recipe.objects.filter(author=obj)
-        return recipes.count()
-
     def get_is_subscribed(self, obj):
-        return CustomUserSerializer.get_is_subscribed(self, obj)
+        """В списке подписок все авторы уже отслеживаются."""
+        return True
 
 
-class SubscriptionCreateSerializer(serializers.ModelSerializer):
-    """Сериализатор создания/удаления подписки на пользователя."""
-
-    subscriber = serializers.IntegerField(source="subscriber.id")
-    author = serializers.IntegerField(source="author.id")
-
-    class Meta:
-        model = Subscription
-        fields = ["subscriber", "author"]
-
-    def validate(self, data):
-        subscriber = data["subscriber"]["id"]
-        author = data["author"]["id"]
-        if Subscription.objects.filter(
-            subscriber=subscriber,
-            author=author
-        ).exists():
-            raise ValidationError('Вы уже подписаны на этого пользователя.')
-        if subscriber == author:
-            raise ValidationError('Нельзя подписаться на самого себя.')
-        return data
-
-    def create(self, validated_data):
-        author = get_object_or_404(
-            User, pk=validated_data["author"]["id"]
-        )
-        subscriber = get_object_or_404(
-            User, pk=validated_data["subscriber"]["id"]
-        )
-        subscription = Subscription.objects.create(
-            author=author, subscriber=subscriber
-        )
-        return subscription
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список рецептов для массового добавления и удаления."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=100
+    )
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
@@ -1,41 +1,72 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingСart, Tag)
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingСart, Tag,
+                            TimelineEntry)
+from recipes.search import fuzzy_search_ingredients, ingredient_index
+from recipes.versions import INGREDIENTS, TAGS
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.exceptions import ValidationError
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from users.models import Subscription, User
 
-from .filters import IngredientFilter, RecipeFilter
-from .pagination import LimitPagination
+from .exporters import SHOPPING_CART_RENDERERS, shopping_cart_rows
+from .filters import RecipeFilter
+from .metrics import PrometheusRenderer, metrics
+from .mixins import DataVersionCacheMixin, QueryBudgetMixin
+from .pagination import KeysetPagination, TimelinePagination
 from .permissions import IsAdminOrOwnerOrReadOnly, IsAdminOrReadOnly
 from .serializers import (CreateRecipeSerializer, CustomUserCreateSerializer,
                           CustomUserSerializer, IngredientSerializer,
-                          RecipeSerializer, SubscriptionCreateSerializer,
+                          RecipeIdsSerializer, RecipeSerializer,
                           SubscriptionSerializer, TagSerializer)
 
-FILENAME = 'shopping_cart.txt'
+FILENAME = 'shopping_cart'
+RECIPES_LIMIT_DEFAULT = 3
+RECIPES_LIMIT_MAX = 30
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(QueryBudgetMixin, viewsets.ModelViewSet):
     """Отображение и создание рецептов.
     Добавление в избранное, в список покупок.
     """
     queryset = Recipe.objects.all()
-    pagination_class = LimitPagination
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-pub_date', '-id')
+    # Поиск сортирует по релевантности, курсор по дате к нему не подходит.
+    keyset_disabled_by = ('search',)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    # Токен, проверка тегов из фильтра, COUNT, страница рецептов,
+    # теги, ингредиенты и три набора связей текущего пользователя.
+    # Лента вместо проверки тегов и COUNT сверяет популярных авторов
+    # из подписок и забирает их новые рецепты.
+    query_budget = {
+        'list': 9,
+        'retrieve': 7,
+        'feed': 9,
+        'similar': 7,
+    }
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            queryset = queryset.with_details()
+        elif self.action in ('partial_update', 'destroy'):
+            # Автор нужен проверке прав доступа и ответу на правку.
+            queryset = queryset.select_related('author')
+        return queryset
 
     def get_permissions(self):
         """Определение права доступа для запросов."""
         if self.action in (
-            'create', 'favorite', 'shopping_cart', 'download_shopping_cart'
+            'create', 'favorite', 'shopping_cart', 'download_shopping_cart',
+            'feed'
         ):
             self.permission_classes = (IsAuthenticated, )
         elif self.action in ('partial_update', 'destroy'):
@@ -70,69 +101,185 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     def add_delete_recipe(self, model, pk, method):
         """Вспомогательная функция для добавления/удаления
-        рецепта в избранное/ корзину."""
+        рецепта в избранное/ корзину.
+        Существование рецепта проверяется, только если строка
+        не добавилась или не удалилась."""
         user = self.request.user
-        recipe = get_object_or_404(Recipe, pk=pk)
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise NotFound()
         if method == "POST":
-            obj = model.objects.get_or_create(user=user, recipe=recipe)
-            if obj[1] is False:
-                raise ValidationError('Рецепт уже был добавлен.')
-            return Response(
-                {'Рецепт добавлен.'}, status=status.HTTP_201_CREATED
-            )
+            if model.objects.add(user.id, recipe_id):
+                return Response(
+                    {'Рецепт добавлен.'}, status=status.HTTP_201_CREATED
+                )
+            get_object_or_404(Recipe, pk=recipe_id)
+            raise ValidationError('Рецепт уже был добавлен.')
         if method == "DELETE":
-            obj = model.objects.filter(user=user, recipe=recipe).delete()
-            if obj[0] == 0:
-                raise ValidationError('Рецепт уже был удален/не был добавлен.')
-            return Response(
-                {'Рецепт удален.'}, status=status.HTTP_204_NO_CONTENT
-            )
+            if model.objects.remove(user.id, recipe_id):
+                return Response(
+                    {'Рецепт удален.'}, status=status.HTTP_204_NO_CONTENT
+                )
+            get_object_or_404(Recipe, pk=recipe_id)
+            raise ValidationError('Рецепт уже был удален/не был добавлен.')
+
+    @action(detail=False, methods=["POST", "DELETE"], url_path='favorite')
+    def favorite_batch(self, request):
+        """Добавление/удаление списка рецептов в избранном."""
+        return self.add_delete_recipes(Favorite, request)
+
+    @action(
+        detail=False, methods=["POST", "DELETE"], url_path='shopping_cart'
+    )
+    def shopping_cart_batch(self, request):
+        """Добавление/удаление списка рецептов в корзине."""
+        return self.add_delete_recipes(ShoppingСart, request)
+
+    def add_delete_recipes(self, model, request):
+        """Добавляет или удаляет рецепты из тела запроса одной вставкой
+        или одним удалением и возвращает итог по каждому рецепту.
+        Итог строится по строкам, которые изменил сам запрос."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        if request.method == 'POST':
+            changed = model.objects.add_many(request.user.id, recipe_ids)
+            outcomes = ('added', 'already_added')
+        else:
+            changed = model.objects.remove_many(request.user.id, recipe_ids)
+            outcomes = ('removed', 'not_added')
+        existing = changed | set(Recipe.objects.filter(
+            pk__in=[
+                recipe_id for recipe_id in recipe_ids
+                if recipe_id not in changed
+            ]
+        ).values_list('id', flat=True))
+        return Response({'results': [
+            {
+                'id': recipe_id,
+                'status': (
+                    outcomes[0] if recipe_id in changed
+                    else outcomes[1] if recipe_id in existing
+                    else 'not_found'
+                ),
+            }
+            for recipe_id in recipe_ids
+        ]})
 
-    @action(detail=False, methods=['GET'],)
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk):
+        """Рецепты, похожие по ингредиентам, из сохраненного списка
+        соседей. Существование рецепта проверяется, только если
+        соседей нет."""
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise NotFound()
+        recipes = Recipe.objects.with_details().filter(
+            similar_to__recipe_id=recipe_id
+        ).order_by('-similar_to__score', '-id')
+        serializer = RecipeSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        )
+        data = serializer.data
+        if not data:
+            get_object_or_404(Recipe, pk=recipe_id)
+        return Response(data)
+
+    @action(detail=False, methods=['GET'])
+    def feed(self, request):
+        """Лента новых рецептов авторов из подписок.
+        Страница ленты - один проход по индексу ленты пользователя,
+        рецепты популярных авторов забираются в ленту на первой странице.
+        """
+        paginator = TimelinePagination()
+        if not request.query_params.get(paginator.cursor_query_param):
+            TimelineEntry.objects.pull(request.user.id)
+        entries = paginator.paginate_queryset(
+            TimelineEntry.objects.filter(user=request.user).only(
+                'pub_date', 'recipe_id'
+            ),
+            request,
+            self
+        )
+        recipes = Recipe.objects.with_details().in_bulk(
+            [entry.recipe_id for entry in entries]
+        )
+        serializer = RecipeSerializer(
+            [
+                recipes[entry.recipe_id] for entry in entries
+                if entry.recipe_id in recipes
+            ],
+            many=True,
+            context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        renderer_classes=SHOPPING_CART_RENDERERS
+    )
     def download_shopping_cart(self, request):
-        """Формирование списка покупок."""
-        ingredients_to_buy = (
-            RecipeIngredient.objects.filter(
-                recipe__shopping_cart__user=request.user).values(
-                    "ingredient__name",
-                    "ingredient__measurement_unit",
-            ).annotate(total_amount=Sum("amount"))
+        """Формирование списка покупок.
+        Формат выбирается параметром format: txt, csv или pdf.
+        Список читается уже при отдаче потока, поэтому его запрос
+        не учитывают query_budget и метрики /api/metrics; число
+        запросов маршрута вместе с ним показывает benchmark_api.
+        """
+        renderer = request.accepted_renderer
+        if not renderer.available:
+            raise ValidationError(
+                f'Формат {renderer.format} сейчас недоступен.'
+            )
+        title = f"Список покупок юзера {request.user.username}"
+        response = StreamingHttpResponse(
+            renderer.stream(title, shopping_cart_rows(request.user)),
+            content_type=renderer.content_type
         )
-        shopping_cart = []
-        shopping_cart.append(f"Список покупок юзера {request.user.username}\n")
-        for i in ingredients_to_buy:
-            name = i["ingredient__name"]
-            amount = i["total_amount"]
-            measurement_unit = i["ingredient__measurement_unit"]
-            shopping_cart.append(f"{name} ({measurement_unit}) - {amount}")
-        shopping_list = "\n".join(shopping_cart)
-        response = HttpResponse(
-            shopping_list, content_type="text/plain,charset=utf8"
+        response['Content-Disposition'] = (
+            f'attachment; filename={renderer.get_filename(FILENAME)}'
         )
-        response['Content-Disposition'] = f'attachment; filename={FILENAME}'
         return response
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
-    """Отображение ингредиентов."""
+class IngredientViewSet(DataVersionCacheMixin, viewsets.ModelViewSet):
+    """Отображение ингредиентов.
+    Поиск по параметру name обслуживается индексом в памяти,
+    с fuzzy=true - нечетким поиском по триграммам.
+    """
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAdminOrReadOnly, )
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
+    data_version_name = INGREDIENTS
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('name') is None:
+            return super().list(request, *args, **kwargs)
+        return self.versioned_response(self.search, request)
+
+    def search(self, request):
+        """Поиск по имени, ответ кешируется по версии справочника."""
+        name = request.query_params['name']
+        if request.query_params.get('fuzzy') in ('1', 'true', 'True'):
+            return Response(fuzzy_search_ingredients(name))
+        return Response(ingredient_index.search(name))
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(DataVersionCacheMixin, viewsets.ModelViewSet):
     """Отображение тегов."""
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (IsAdminOrReadOnly,)
+    data_version_name = TAGS
 
 
 class CustomUserViewSet(UserViewSet):
     """Отображение пользователей. Подписка и ее отмена."""
     queryset = User.objects.all()
-    pagination_class = LimitPagination
+    pagination_class = KeysetPagination
+    keyset_ordering = ('username', 'id')
 
     def get_serializer_class(self):
         """Определение класса сериалайзера."""
@@ -152,39 +299,82 @@ class CustomUserViewSet(UserViewSet):
 
     @action(detail=True, methods=["POST", "DELETE"])
     def subscribe(self, request, id):
-        """Создание/удаление подписки на пользователя."""
-        data = {'subscriber': request.user.id, 'author': id}
-        serializer = SubscriptionCreateSerializer(
-            data=data, context={'request': request}
-        )
+        """Создание/удаление подписки на пользователя.
+        Существование автора проверяется только при неудачной вставке."""
+        try:
+            author_id = int(id)
+        except ValueError:
+            raise NotFound()
         if request.method == "POST":
-            serializer.is_valid(raise_exception=True)
-            serializer.save(user=request.user)
-            return Response(
-                serializer.data,
-                status=status.HTTP_201_CREATED
-            )
+            if author_id == request.user.id:
+                raise ValidationError('Нельзя подписаться на самого себя.')
+            if Subscription.objects.subscribe(request.user.id, author_id):
+                return Response(
+                    {'subscriber': request.user.id, 'author': author_id},
+                    status=status.HTTP_201_CREATED
+                )
+            get_object_or_404(User, pk=author_id)
+            raise ValidationError('Вы уже подписаны на этого пользователя.')
         if request.method == 'DELETE':
-            subscription = Subscription.objects.filter(
-                subscriber=request.user, author__id=id
-            )
-            obj = subscription.delete()
-            if obj[0] == 0:
+            if not Subscription.objects.unsubscribe(
+                request.user.id, author_id
+            ):
                 raise ValidationError('Вы не подписаны на этого пользователя.')
             return Response(
                 {'Вы отменили подписку на пользователя'},
                 status=status.HTTP_204_NO_CONTENT
             )
 
+    def get_recipes_limit(self):
+        """Число рецептов автора в выдаче подписок."""
+        recipes_limit = self.request.query_params.get(
+            'recipes_limit', RECIPES_LIMIT_DEFAULT
+        )
+        try:
+            recipes_limit = int(recipes_limit)
+        except (TypeError, ValueError):
+            raise ValidationError(
+                {'recipes_limit': 'Ожидается целое число.'}
+            )
+        if recipes_limit < 0:
+            raise ValidationError(
+                {'recipes_limit': 'Ожидается неотрицательное число.'}
+            )
+        return min(recipes_limit, RECIPES_LIMIT_MAX)
+
     @action(detail=False, methods=["GET"])
     def subscriptions(self, request):
-        """Просмотр подписок."""
+        """Просмотр подписок.
+        Для каждого автора загружаются только последние recipes_limit
+        рецептов, число рецептов берется из счетчика автора.
+        """
+        latest_recipes = Recipe.objects.filter(
+            pk__in=Subquery(
+                Recipe.objects.filter(
+                    author=OuterRef('author')
+                ).order_by('-pub_date').values('pk')[:self.get_recipes_limit()]
+            )
+        )
         subscriptions = User.objects.filter(
             subscribers__subscriber=self.request.user
+        ).prefetch_related(
+            Prefetch(
+                'recipes',
+                queryset=latest_recipes,
+                to_attr='limited_recipes'
+            )
         )
-        paginator = LimitPagination()
-        result_page = paginator.paginate_queryset(subscriptions, request)
+        result_page = self.paginate_queryset(subscriptions)
         serializer = SubscriptionSerializer(
             result_page, many=True, context={"request": request}
         )
-        return paginator.get_paginated_response(serializer.data)
+        return self.get_paginated_response(serializer.data)
+
+
+class MetricsView(APIView):
+    """Метрики действий API в формате Prometheus, только для персонала."""
+    permission_classes = (IsAdminUser,)
+    renderer_classes = (PrometheusRenderer,)
+
+    def get(self, request):
+        return Response(metrics.collect())
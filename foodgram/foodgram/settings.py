@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -24,17 +25,20 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     "rest_framework.authtoken",
     'rest_framework',
     'recipes',
     'api',
     'users',
+    'jobs',
     'sorl.thumbnail',
     'djoser',
     'django_filters',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -75,6 +79,22 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.filebased.FileBasedCache'
+        ),
+        'LOCATION': os.getenv(
+            'CACHE_LOCATION',
+            default=os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+        ),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    }
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
 
@@ -124,12 +144,14 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        "rest_framework.authentication.TokenAuthentication",
-        "rest_framework.authentication.BasicAuthentication",
+        "api.authentication.CachedTokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ),
 }
 
+# Сколько секунд соответствие токена и пользователя хранится в кеше.
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', default=300))
+
 DJOSER = {
     'HIDE_USERS': False,
     'SEND_ACTIVATION_EMAIL': False,
@@ -144,3 +166,45 @@ DJOSER = {
 }
 
 IMPORT_DATA_ADRESS = os.path.join(BASE_DIR, 'data')
+
+# TTF-шрифт с кириллицей для выгрузки списка покупок в PDF.
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Нечеткий поиск ингредиентов: 'auto' (pg_trgm в PostgreSQL,
+# иначе индекс в памяти), 'postgres' или 'memory'.
+INGREDIENT_FUZZY_BACKEND = os.getenv(
+    'INGREDIENT_FUZZY_BACKEND', default='auto'
+)
+INGREDIENT_FUZZY_THRESHOLD = 0.3
+INGREDIENT_FUZZY_LIMIT = 20
+
+# Очередь фоновых задач (python manage.py run_jobs).
+JOBS_RUN_EAGERLY = os.getenv('JOBS_RUN_EAGERLY', default='') == 'True'
+JOBS_MAX_ATTEMPTS = 3
+JOBS_RETRY_DELAY = 30
+JOBS_STALE_AFTER = 600
+
+# Ленты подписок: рецепт автора, у которого подписчиков больше порога,
+# не раскладывается по лентам, а забирается читателями при чтении.
+# При подписке в ленту попадают последние FEED_BACKFILL_LIMIT рецептов.
+FEED_FANOUT_MAX_SUBSCRIBERS = int(
+    os.getenv('FEED_FANOUT_MAX_SUBSCRIBERS', default=5000)
+)
+FEED_BACKFILL_LIMIT = 200
+
+# Сколько похожих рецептов хранится для каждого рецепта.
+SIMILAR_RECIPES_LIMIT = 10
+
+# Метрики API для /api/metrics: каждый процесс сбрасывает свои счетчики
+# в общий каталог не реже раза в METRICS_FLUSH_INTERVAL секунд.
+METRICS_DIR = os.getenv(
+    'METRICS_DIR',
+    default=os.path.join(tempfile.gettempdir(), 'foodgram_metrics')
+)
+METRICS_FLUSH_INTERVAL = 5
+
+# Проверка бюджета SQL-запросов на действие: '', 'warn' или 'strict'.
+QUERY_BUDGET_CHECK = os.getenv('QUERY_BUDGET_CHECK', default='')
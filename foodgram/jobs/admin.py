@@ -0,0 +1,12 @@
+from django.contrib import admin
+
+from .models import Job
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'created', 'finished')
+    list_filter = ('status', 'name')
+    readonly_fields = ('created', 'started', 'finished', 'error')
+
+
+admin.site.register(Job, JobAdmin)
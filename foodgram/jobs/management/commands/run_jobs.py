@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from jobs.queue import run_next
+
+
+class Command(BaseCommand):
+    help = 'Обработчик очереди фоновых задач'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить все готовые задачи и завершиться',
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=1.0,
+            help='Пауза в секундах, когда очередь пуста',
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            if run_next():
+                processed += 1
+                continue
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(f'Выполнено задач: {processed}.')
@@ -0,0 +1,116 @@
+import json
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+class PermanentJobError(Exception):
+    """Ошибка, которую повтор задачи не исправит: задача сразу
+    помечается как неудавшаяся."""
+
+
+def task(name):
+    """Регистрирует функцию как фоновую задачу с именем name."""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def enqueue(name, **payload):
+    """Ставит задачу в очередь.
+
+    Запись создается в текущей транзакции, поэтому обработчик увидит
+    задачу только вместе с данными, ради которых она поставлена.
+    При JOBS_RUN_EAGERLY задача выполняется сразу после коммита.
+    """
+    if name not in TASKS:
+        raise KeyError(f'Неизвестная фоновая задача: {name}')
+    job = Job.objects.create(name=name, payload=json.dumps(payload))
+    if settings.JOBS_RUN_EAGERLY:
+        transaction.on_commit(lambda: run_claimed(claim(job)))
+    return job
+
+
+def claim(job):
+    """Помечает задачу как выполняемую, если ее не забрал другой
+    обработчик. Число попыток растет при каждом захвате, поэтому
+    зависшую задачу, прочитанную двумя обработчиками, получит один.
+    Возвращает задачу или None."""
+    now = timezone.now()
+    claimed = Job.objects.filter(
+        pk=job.pk, status=job.status, attempts=job.attempts
+    ).update(
+        status=Job.RUNNING, started=now, attempts=F('attempts') + 1
+    )
+    if not claimed:
+        return None
+    job.refresh_from_db()
+    return job
+
+
+def claim_next():
+    """Забирает следующую готовую к выполнению задачу.
+
+    Задачи, зависшие в статусе "выполняется" дольше JOBS_STALE_AFTER
+    секунд (например, после падения обработчика), берутся повторно.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.JOBS_STALE_AFTER)
+    candidates = Job.objects.filter(
+        Q(status=Job.PENDING, run_after__lte=now)
+        | Q(status=Job.RUNNING, started__lt=stale)
+    ).order_by('run_after', 'id')[:10]
+    for job in candidates:
+        job = claim(job)
+        if job is not None:
+            return job
+    return None
+
+
+def run_claimed(job):
+    """Выполняет забранную задачу и сохраняет результат."""
+    if job is None:
+        return
+    try:
+        TASKS[job.name](**json.loads(job.payload))
+    except PermanentJobError:
+        logger.warning('Фоновая задача %s не может быть выполнена', job)
+        job.error = traceback.format_exc()
+        job.status = Job.FAILED
+        job.finished = timezone.now()
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой', job)
+        job.error = traceback.format_exc()
+        if job.attempts < settings.JOBS_MAX_ATTEMPTS:
+            job.status = Job.PENDING
+            job.run_after = timezone.now() + timedelta(
+                seconds=settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+            )
+        else:
+            job.status = Job.FAILED
+            job.finished = timezone.now()
+    else:
+        job.status = Job.DONE
+        job.finished = timezone.now()
+        job.error = ''
+    job.save(update_fields=('status', 'run_after', 'finished', 'error'))
+
+
+def run_next():
+    """Выполняет одну задачу из очереди. Возвращает False,
+    если выполнять нечего."""
+    job = claim_next()
+    run_claimed(job)
+    return job is not None
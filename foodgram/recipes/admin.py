@@ -1,37 +1,107 @@
 from django.contrib import admin
 
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingСart, Tag)
+                     ShoppingListItem, ShoppingСart, Tag)
+from .search import ingredient_index, search_recipes
+from .tasks import schedule_image_processing, schedule_similarity_update
 
 
 class IngredientInlineAdmin(admin.TabularInline):
     model = Recipe.ingredients.through
+    autocomplete_fields = ('ingredient',)
     min_num = 1
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'ingredient'
+        )
+
 
 class TagAdmin(admin.ModelAdmin):
     list_display = ('name', 'colour', 'slug')
+    search_fields = ('name', 'slug')
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    list_display = ('name', 'author', 'favorites_count')
-    list_filter = ('tags', 'author', 'ingredients',)
+    """Рецепты.
+
+    Списки авторов и ингредиентов не выводятся целиком ни в фильтрах,
+    ни в формах: вместо них поиск и автодополнение.
+    """
+    list_display = (
+        'name', 'author', 'pub_date', 'favorites_count', 'carts_count'
+    )
+    list_filter = ('tags', 'image_status')
+    list_select_related = ('author',)
     search_fields = ('name',)
+    autocomplete_fields = ('author', 'tags')
+    show_full_result_count = False
     inlines = (IngredientInlineAdmin,)
 
-    def favorites_count(self, obj):
-        return obj.favorites.count()
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу рецептов."""
+        if not search_term:
+            return queryset, False
+        return search_recipes(queryset, search_term), False
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data:
+            schedule_image_processing(obj)
 
-    favorites_count.short_description = "Число добавлений в Избранное"
+    def save_related(self, request, form, formsets, change):
+        """Переносит правку ингредиентов в списки покупок
+        и похожие рецепты."""
+        recipe_ingredients = RecipeIngredient.objects.filter(
+            recipe=form.instance
+        )
+        old_amounts = dict(
+            recipe_ingredients.values_list('ingredient_id', 'amount')
+        )
+        super().save_related(request, form, formsets, change)
+        new_amounts = dict(
+            recipe_ingredients.values_list('ingredient_id', 'amount')
+        )
+        ShoppingListItem.objects.change_recipe(
+            form.instance, old_amounts, new_amounts
+        )
+        if old_amounts.keys() != new_amounts.keys():
+            schedule_similarity_update(form.instance)
 
 
 class IngredientAdmin(admin.ModelAdmin):
-    list_filter = ('name',)
+    list_display = ('name', 'measurement_unit')
+    list_filter = ('measurement_unit',)
+    search_fields = ('name',)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по индексу ингредиентов в памяти, как в API."""
+        if not search_term:
+            return queryset, False
+        return queryset.filter(pk__in=[
+            item['id'] for item in ingredient_index.search(search_term)
+        ]), False
+
+
+class RecipeIngredientAdmin(admin.ModelAdmin):
+    list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
+    autocomplete_fields = ('recipe', 'ingredient')
+    show_full_result_count = False
+
+
+class UserRecipeAdmin(admin.ModelAdmin):
+    """Связи пользователя с рецептом: избранное и корзина."""
+    list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    search_fields = ('^user__username',)
+    show_full_result_count = False
 
 
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
-admin.site.register(RecipeIngredient)
-admin.site.register(Favorite)
-admin.site.register(ShoppingСart)
+admin.site.register(RecipeIngredient, RecipeIngredientAdmin)
+admin.site.register(Favorite, UserRecipeAdmin)
+admin.site.register(ShoppingСart, UserRecipeAdmin)
@@ -1,5 +1,8 @@
 from django.apps import AppConfig
 
 
-class AppConfig(AppConfig):
+class RecipesConfig(AppConfig):
     name = 'recipes'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,127 @@
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+VARIANTS_DIR = 'variants'
+MAX_SIZE = (2048, 2048)
+JPEG_QUALITY = 90
+SAVE_FORMATS = {'JPEG', 'PNG', 'WEBP', 'GIF'}
+VARIANT_FORMAT, VARIANT_EXTENSION = (
+    ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+)
+# Имя варианта: (ширина, высота, обрезать ли под размер).
+VARIANTS = {
+    'card': (360, 240, True),
+    'retina': (720, 480, True),
+    'detail': (1080, 1080, False),
+}
+
+
+def variant_name(name, variant):
+    """Путь варианта изображения в хранилище.
+    Повторяет путь оригинала, чтобы имена вариантов не пересекались.
+    """
+    return f'{VARIANTS_DIR}/{name}.{variant}.{VARIANT_EXTENSION}'
+
+
+def variant_urls(image, ready=True):
+    """Адреса всех вариантов изображения без обращения к хранилищу.
+    Пока варианты не готовы, все они указывают на оригинал.
+    """
+    if not image:
+        return {}
+    if not ready:
+        return {variant: image.url for variant in VARIANTS}
+    return {
+        variant: image.storage.url(variant_name(image.name, variant))
+        for variant in VARIANTS
+    }
+
+
+def check_image_header(content):
+    """Проверяет по заголовку, что байты - изображение поддерживаемого
+    формата. Файл не декодируется, поэтому проверка не зависит от
+    размера снимка. Возвращает формат или вызывает ValueError."""
+    try:
+        source_format = Image.open(BytesIO(content)).format
+    except (OSError, Image.DecompressionBombError) as err:
+        raise ValueError(f'Файл не является изображением: {err}')
+    if source_format not in SAVE_FORMATS:
+        raise ValueError(f'Неподдерживаемый формат: {source_format}')
+    return source_format
+
+
+def normalize_image(image):
+    """Проверяет и нормализует загруженное фото на месте.
+
+    Поворачивает по EXIF, отбрасывает метаданные и уменьшает снимок
+    до MAX_SIZE. Уже нормализованный файл не перекодируется, поэтому
+    повторный запуск задачи не ухудшает JPEG. Битый или
+    неподдерживаемый файл вызывает ValueError. Возвращает имя файла
+    в хранилище: оно может измениться при сохранении.
+    """
+    storage = image.storage
+    with storage.open(image.name, 'rb') as file:
+        try:
+            source = Image.open(file)
+            source_format = source.format
+            has_exif = bool(source.getexif())
+            source = ImageOps.exif_transpose(source)
+            source.load()
+        except (OSError, Image.DecompressionBombError) as err:
+            raise ValueError(f'Файл не является изображением: {err}')
+    if source_format not in SAVE_FORMATS:
+        raise ValueError(f'Неподдерживаемый формат: {source_format}')
+    if (
+        not has_exif
+        and source.width <= MAX_SIZE[0] and source.height <= MAX_SIZE[1]
+        and not (source_format == 'JPEG' and source.mode != 'RGB')
+    ):
+        return image.name
+    source.thumbnail(MAX_SIZE, Image.LANCZOS)
+    if source_format == 'JPEG' and source.mode != 'RGB':
+        source = source.convert('RGB')
+    buffer = BytesIO()
+    options = {'quality': JPEG_QUALITY} if source_format == 'JPEG' else {}
+    source.save(buffer, source_format, **options)
+    storage.delete(image.name)
+    image.name = storage.save(image.name, ContentFile(buffer.getvalue()))
+    return image.name
+
+
+def render_variant(source, width, height, crop):
+    if crop:
+        result = ImageOps.fit(source, (width, height), Image.LANCZOS)
+    else:
+        result = source.copy()
+        result.thumbnail((width, height), Image.LANCZOS)
+    buffer = BytesIO()
+    result.save(buffer, VARIANT_FORMAT, quality=80)
+    return buffer.getvalue()
+
+
+def generate_variants(image, force=False):
+    """Создает уменьшенные копии изображения для всех вариантов.
+
+    Без force существующие варианты не пересоздаются.
+    """
+    storage = image.storage
+    names = {
+        variant: variant_name(image.name, variant) for variant in VARIANTS
+    }
+    if not force and all(storage.exists(name) for name in names.values()):
+        return
+    with storage.open(image.name, 'rb') as file:
+        source = ImageOps.exif_transpose(Image.open(file))
+        source = source.convert(
+            'RGBA' if VARIANT_FORMAT == 'WEBP' and 'A' in source.getbands()
+            else 'RGB'
+        )
+    for variant, (width, height, crop) in VARIANTS.items():
+        name = names[variant]
+        if storage.exists(name):
+            storage.delete(name)
+        storage.save(
+            name, ContentFile(render_variant(source, width, height, crop))
+        )
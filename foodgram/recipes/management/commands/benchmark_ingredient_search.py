@@ -0,0 +1,74 @@
+import random
+from statistics import median
+from time import perf_counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from recipes.models import Ingredient
+from recipes.search import ingredient_index
+
+
+def with_typo(name, rng):
+    """Название с одной случайной опечаткой."""
+    if len(name) < 3:
+        return name
+    position = rng.randrange(1, len(name) - 1)
+    action = rng.choice(('drop', 'swap', 'replace'))
+    if action == 'drop':
+        return name[:position] + name[position + 1:]
+    if action == 'swap':
+        return (
+            name[:position - 1] + name[position] + name[position - 1]
+            + name[position + 1:]
+        )
+    return name[:position] + rng.choice('аеиоуя') + name[position + 1:]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку нечеткого поиска ингредиентов по индексу '
+        'в памяти на всем справочнике'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--target-ms',
+            type=float,
+            default=5.0,
+            help='Допустимая задержка p99 в миллисекундах',
+        )
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError(
+                'Справочник ингредиентов пуст, выполните import_ingredients.'
+            )
+        rng = random.Random(options['seed'])
+        queries = [
+            with_typo(rng.choice(names), rng)
+            for _ in range(options['queries'])
+        ]
+        ingredient_index.refresh()
+        timings = []
+        for query in queries:
+            started = perf_counter()
+            ingredient_index.fuzzy_search(
+                query,
+                settings.INGREDIENT_FUZZY_THRESHOLD,
+                settings.INGREDIENT_FUZZY_LIMIT
+            )
+            timings.append((perf_counter() - started) * 1000)
+        timings.sort()
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        self.stdout.write(
+            f'Ингредиентов: {len(names)}, запросов: {len(timings)}, '
+            f'p50: {median(timings):.3f} мс, p99: {p99:.3f} мс, '
+            f'max: {timings[-1]:.3f} мс'
+        )
+        if p99 > options['target_ms']:
+            raise CommandError(
+                f'p99 {p99:.3f} мс превышает цель {options["target_ms"]} мс'
+            )
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from recipes.models import SimilarRecipe
+from recipes.similarity import build_similar_recipes
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает похожие рецепты по наборам ингредиентов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Размер пачки при вставке строк',
+        )
+
+    def handle(self, *args, **options):
+        build_similar_recipes(options['batch_size'])
+        self.stdout.write(
+            f'Пар похожих рецептов: {SimilarRecipe.objects.count()}.'
+        )
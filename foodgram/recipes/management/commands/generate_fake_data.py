@@ -0,0 +1,317 @@
+import random
+from collections import Counter
+from io import BytesIO
+from itertools import accumulate, islice
+from time import perf_counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Max
+from PIL import Image
+from recipes.images import generate_variants
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingListItem, ShoppingСart, Tag, TimelineEntry)
+from recipes.search import index_recipes
+from recipes.similarity import build_similar_recipes
+from users.counters import adjust_counters
+from users.models import Subscription, User
+
+DISHES = (
+    'суп', 'борщ', 'салат', 'пирог', 'каша', 'рагу', 'запеканка', 'котлеты',
+    'блины', 'оладьи', 'плов', 'омлет', 'паста', 'соус', 'десерт', 'кекс',
+    'гуляш', 'жаркое', 'сырники', 'пельмени', 'лазанья', 'ризотто',
+)
+ADJECTIVES = (
+    'домашний', 'быстрый', 'овощной', 'куриный', 'сырный', 'летний',
+    'острый', 'сладкий', 'постный', 'праздничный', 'деревенский',
+    'мамин', 'легкий', 'сытный', 'ароматный', 'весенний',
+)
+STEPS = (
+    'нарезать', 'обжарить', 'посолить', 'перемешать', 'запечь', 'отварить',
+    'потушить', 'добавить', 'взбить', 'остудить', 'подавать', 'украсить',
+)
+DEFAULT_TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Десерт', '#F0C300', 'dessert'),
+    ('Перекус', '#2D9CDB', 'snack'),
+)
+PLACEHOLDER_DIR = 'recipes/fake'
+PLACEHOLDER_COLOURS = 24
+# Показатель степенного закона для популярности авторов, рецептов
+# и ингредиентов: чем больше, тем сильнее выделяются лидеры.
+ZIPF_EXPONENT = 1.1
+# Показатель распределения Парето для числа связей у пользователя.
+PARETO_ALPHA = 1.5
+
+
+def zipf_weights(size):
+    """Накопленные веса для rng.choices: вес элемента ранга r - 1/r^s."""
+    return list(accumulate(
+        1 / rank ** ZIPF_EXPONENT for rank in range(1, size + 1)
+    ))
+
+
+def pareto_count(rng, mean, limit):
+    """Число связей пользователя с заданным средним и тяжелым хвостом."""
+    scale = mean * (PARETO_ALPHA - 1) / PARETO_ALPHA
+    return min(int(scale * rng.paretovariate(PARETO_ALPHA)), limit)
+
+
+def weighted_sample(rng, population, cum_weights, size):
+    """До size разных элементов, выбранных с весами."""
+    chosen = set()
+    for _ in range(10):
+        if len(chosen) >= size:
+            break
+        chosen.update(rng.choices(
+            population, cum_weights=cum_weights, k=size - len(chosen)
+        ))
+    return chosen
+
+
+def batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class Command(BaseCommand):
+    help = (
+        'Создает синтетических пользователей, рецепты, избранное, корзины '
+        'и подписки для нагрузочного тестирования'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--favorites', type=float, default=20,
+            help='Среднее число избранных рецептов у пользователя',
+        )
+        parser.add_argument(
+            '--carts', type=float, default=3,
+            help='Среднее число рецептов в корзине пользователя',
+        )
+        parser.add_argument(
+            '--subscriptions', type=float, default=10,
+            help='Среднее число подписок у пользователя',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredients:
+            raise CommandError(
+                'Справочник ингредиентов пуст, выполните import_ingredients.'
+            )
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.started = perf_counter()
+        with transaction.atomic():
+            users = self.create_users(options['users'], options['seed'])
+            # Порядок популярности авторов: одни и те же пользователи
+            # пишут больше рецептов и собирают больше подписчиков.
+            self.authors = users[:]
+            self.rng.shuffle(self.authors)
+            recipes = self.create_recipes(
+                options['recipes'], ingredients, self.get_tags()
+            )
+            self.create_relations(users, recipes, options)
+            self.log('Пересборка списков покупок')
+            ShoppingListItem.objects.rebuild(self.batch_size)
+            self.log('Ленты подписок')
+            TimelineEntry.objects.rebuild()
+            self.log('Похожие рецепты')
+            build_similar_recipes(self.batch_size)
+            self.log('Полнотекстовый индекс')
+            for batch in batches(recipes, self.batch_size):
+                index_recipes(batch)
+        self.log(
+            f'Готово: пользователей {len(users)}, рецептов {len(recipes)}'
+        )
+
+    def log(self, message):
+        elapsed = perf_counter() - self.started
+        self.stdout.write(f'[{elapsed:7.1f} с] {message}')
+
+    def insert(self, model, objects):
+        """Вставляет объекты из генератора пачками, не держа их
+        в памяти. Возвращает id новых строк: они идут по порядку после
+        прежнего максимума, а bulk_create в SQLite их не возвращает."""
+        last_id = model.objects.aggregate(last=Max('id'))['last'] or 0
+        self.insert_objects(model, objects)
+        return list(
+            model.objects.filter(id__gt=last_id).order_by('id').values_list(
+                'id', flat=True
+            )
+        )
+
+    def insert_objects(self, model, objects):
+        batch = []
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.batch_size:
+                model.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch)
+
+    def insert_rows(self, model, fields, rows):
+        """Вставляет кортежи значений полей fields многострочными INSERT
+        в обход моделей: для таблиц связей это на порядок быстрее
+        bulk_create. Уже существующие пары пропускаются."""
+        opts = model._meta
+        quote = connection.ops.quote_name
+        columns = ', '.join(
+            quote(opts.get_field(field).column) for field in fields
+        )
+        placeholder = '({})'.format(', '.join(['%s'] * len(fields)))
+        batch_size = min(self.batch_size, connection.ops.bulk_batch_size(
+            [opts.get_field(field) for field in fields],
+            [None] * self.batch_size
+        ))
+        rows = iter(rows)
+        with connection.cursor() as cursor:
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                cursor.execute(
+                    f'INSERT INTO {quote(opts.db_table)} ({columns}) '
+                    f'VALUES {", ".join([placeholder] * len(batch))} '
+                    'ON CONFLICT DO NOTHING',
+                    [value for row in batch for value in row]
+                )
+
+    def create_users(self, count, seed):
+        self.log(f'Пользователи: {count}')
+        password = make_password('fake-password')
+        prefix = f'fake{seed}_{User.objects.count()}_'
+        return self.insert(User, (
+            User(
+                username=f'{prefix}{number}',
+                email=f'{prefix}{number}@example.com',
+                first_name=f'Имя{number}',
+                last_name=f'Фамилия{number}',
+                password=password,
+            )
+            for number in range(count)
+        ))
+
+    def get_tags(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                Tag(name=name, colour=colour, slug=slug)
+                for name, colour, slug in DEFAULT_TAGS
+            )
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def placeholder_images(self):
+        """Пул заглушек для фото рецептов с готовыми вариантами."""
+        names = []
+        for number in range(PLACEHOLDER_COLOURS):
+            name = f'{PLACEHOLDER_DIR}/placeholder_{number}.png'
+            if not default_storage.exists(name):
+                buffer = BytesIO()
+                Image.new(
+                    'RGB', (1200, 800), self.placeholder_colour(number)
+                ).save(buffer, 'PNG')
+                name = default_storage.save(
+                    name, ContentFile(buffer.getvalue())
+                )
+            generate_variants(Recipe(image=name).image)
+            names.append(name)
+        return names
+
+    @staticmethod
+    def placeholder_colour(number):
+        rng = random.Random(number)
+        return tuple(rng.randrange(60, 230) for _ in range(3))
+
+    def create_recipes(self, count, ingredients, tags):
+        self.log(f'Рецепты: {count}')
+        rng = self.rng
+        images = self.placeholder_images()
+        author_ids = rng.choices(
+            self.authors, cum_weights=zipf_weights(len(self.authors)), k=count
+        )
+        recipes = self.insert(Recipe, (
+            Recipe(
+                author_id=author_id,
+                name=(
+                    f'{rng.choice(ADJECTIVES).capitalize()} '
+                    f'{rng.choice(DISHES)}'
+                ),
+                text=' '.join(rng.choices(STEPS, k=rng.randint(10, 40))),
+                image=rng.choice(images),
+                cooking_time=rng.randint(5, 180),
+            )
+            for author_id in author_ids
+        ))
+        adjust_counters(User, 'recipes_count', Counter(author_ids))
+        self.log('Теги и ингредиенты рецептов')
+        tag_weights = zipf_weights(len(tags))
+        self.insert_rows(Recipe.tags.through, ('recipe', 'tag'), (
+            (recipe_id, tag_id)
+            for recipe_id in recipes
+            for tag_id in weighted_sample(
+                rng, tags, tag_weights, rng.randint(1, 3)
+            )
+        ))
+        catalog = ingredients[:]
+        rng.shuffle(catalog)
+        ingredient_weights = zipf_weights(len(catalog))
+        self.insert_rows(
+            RecipeIngredient, ('recipe', 'ingredient', 'amount'), (
+                (recipe_id, ingredient_id, rng.randint(1, 500))
+                for recipe_id in recipes
+                for ingredient_id in weighted_sample(
+                    rng, catalog, ingredient_weights,
+                    max(1, int(rng.gauss(8, 3)))
+                )
+            )
+        )
+        return recipes
+
+    def create_relations(self, users, recipes, options):
+        rng = self.rng
+        popular_recipes = recipes[:]
+        rng.shuffle(popular_recipes)
+        recipe_weights = zipf_weights(len(popular_recipes))
+        for model, field, mean in (
+            (Favorite, 'favorites_count', options['favorites']),
+            (ShoppingСart, 'carts_count', options['carts']),
+        ):
+            self.log(f'{model._meta.verbose_name_plural}')
+            counts = Counter()
+            self.insert_rows(model, ('user', 'recipe'), (
+                (user_id, recipe_id)
+                for user_id in users
+                for recipe_id in self.count_into(counts, weighted_sample(
+                    rng, popular_recipes, recipe_weights,
+                    pareto_count(rng, mean, len(recipes))
+                ))
+            ))
+            adjust_counters(Recipe, field, counts)
+        self.log('Подписки')
+        author_weights = zipf_weights(len(self.authors))
+        counts = Counter()
+        self.insert_rows(Subscription, ('subscriber', 'author'), (
+            (user_id, author_id)
+            for user_id in users
+            for author_id in self.count_into(counts, weighted_sample(
+                rng, self.authors, author_weights,
+                pareto_count(rng, options['subscriptions'], len(users) - 1)
+            ) - {user_id})
+        ))
+        adjust_counters(User, 'subscribers_count', counts)
+
+    @staticmethod
+    def count_into(counts, ids):
+        counts.update(ids)
+        return ids
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from recipes.images import generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Создает уменьшенные копии фотографий уже загруженных рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать и уже существующие варианты',
+        )
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        for recipe in Recipe.objects.only('id', 'image').iterator():
+            try:
+                generate_variants(recipe.image, force=options['force'])
+            except (OSError, ValueError) as err:
+                failed += 1
+                self.stdout.write(
+                    f'Рецепт {recipe.id}: не удалось обработать '
+                    f'{recipe.image.name} - {err}'
+                )
+            else:
+                processed += 1
+        self.stdout.write(
+            f'Обработано фотографий: {processed}, с ошибками: {failed}.'
+        )
@@ -1,40 +1,132 @@
 import csv
+import json
+import os
+import re
+from itertools import islice
 
-from django.core.management.base import BaseCommand
-from django.db import IntegrityError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 from recipes.models import Ingredient
+from recipes.versions import INGREDIENTS, bump_data_version
 
 from foodgram.settings import IMPORT_DATA_ADRESS
 
+SKIP_RE = re.compile(r'[\s,]*')
 
-class Command(BaseCommand):
-    help = 'Импортирует базу данных для модели Ingredients из файла csv'
 
-    def handle(self, *args, **options):
+def read_csv(file):
+    for row in csv.DictReader(file):
+        yield row['name'], row['measurement_unit']
 
-        with open(
-            f'{IMPORT_DATA_ADRESS}/ingredients.csv',
-            'r', encoding="utf-8-sig"
-        ) as csv_file:
-            datareader = csv.DictReader(csv_file)
 
-            for row in datareader:
+def read_json(file, chunk_size=64 * 1024):
+    """Потоково читает массив объектов JSON, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив ингредиентов.')
+    position = 1
+    while True:
+        position = SKIP_RE.match(buffer, position).end()
+        if buffer.startswith(']', position):
+            return
+        try:
+            row, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                raise CommandError('Файл JSON обрывается на середине.')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        yield row['name'], row['measurement_unit']
 
-                try:
-                    ingredient_name = row['name']
 
-                    Ingredient.objects.create(
-                        name=row['name'],
-                        measurement_unit=row['measurement_unit']
-                    )
+READERS = {
+    '.csv': read_csv,
+    '.json': read_json,
+}
 
-                except IntegrityError as err:
+
+class Command(BaseCommand):
+    help = (
+        'Импортирует базу данных для модели Ingredients из файла csv '
+        'или json пачками, повторный импорт обновляет только изменения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=os.path.join(IMPORT_DATA_ADRESS, 'ingredients.csv'),
+            help='Путь к ingredients.csv или ingredients.json',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Число строк, обрабатываемых за один запрос',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Показать изменения, не записывая их в базу',
+        )
+
+    def import_batch(self, batch, dry_run):
+        """Записывает пачку строк, возвращает число вставленных,
+        обновленных и пропущенных ингредиентов."""
+        rows = dict(batch)
+        existing = {
+            ingredient.name: ingredient
+            for ingredient in Ingredient.objects.filter(name__in=rows)
+        }
+        to_create = []
+        to_update = []
+        for name, measurement_unit in rows.items():
+            ingredient = existing.get(name)
+            if ingredient is None:
+                to_create.append(
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                )
+                if dry_run:
+                    self.stdout.write(f'+ {name} ({measurement_unit})')
+            elif ingredient.measurement_unit != measurement_unit:
+                if dry_run:
                     self.stdout.write(
-                        f'Ингредиент {ingredient_name} уже внесен в базу. '
-                        f'Ошибка внесения - {err}'
+                        f'~ {name}: {ingredient.measurement_unit} '
+                        f'-> {measurement_unit}'
                     )
+                ingredient.measurement_unit = measurement_unit
+                to_update.append(ingredient)
+        if not dry_run:
+            Ingredient.objects.bulk_create(to_create, ignore_conflicts=True)
+            Ingredient.objects.bulk_update(to_update, ['measurement_unit'])
+        skipped = len(batch) - len(to_create) - len(to_update)
+        return len(to_create), len(to_update), skipped
 
-                else:
-                    self.stdout.write(
-                        f'Ингредиент {ingredient_name} внесен в базу.'
+    def handle(self, *args, **options):
+        path = options['path']
+        reader = READERS.get(os.path.splitext(path)[1].lower())
+        if reader is None:
+            raise CommandError('Поддерживаются только файлы csv и json.')
+        inserted = updated = skipped = 0
+        with open(path, 'r', encoding='utf-8-sig') as file:
+            rows = reader(file)
+            with transaction.atomic():
+                while True:
+                    batch = list(islice(rows, options['batch_size']))
+                    if not batch:
+                        break
+                    batch_inserted, batch_updated, batch_skipped = (
+                        self.import_batch(batch, options['dry_run'])
                     )
+                    inserted += batch_inserted
+                    updated += batch_updated
+                    skipped += batch_skipped
+        if not options['dry_run'] and (inserted or updated):
+            bump_data_version(INGREDIENTS)
+        self.stdout.write(
+            f'Добавлено: {inserted}, обновлено: {updated}, '
+            f'пропущено: {skipped}.'
+        )
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Recipe
+from recipes.search import index_recipes
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает полнотекстовый индекс рецептов'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            index_recipes()
+        self.stdout.write(
+            f'Проиндексировано рецептов: {Recipe.objects.count()}.'
+        )
@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает сводные списки покупок из корзин пользователей '
+        'и сверяет их с живой агрегацией'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить списки, ничего не меняя',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при вставке строк',
+        )
+
+    def find_mismatches(self):
+        stored = {
+            (user_id, ingredient_id): amount
+            for user_id, ingredient_id, amount in (
+                ShoppingListItem.objects.values_list(
+                    'user_id', 'ingredient_id', 'amount'
+                ).iterator()
+            )
+        }
+        mismatches = []
+        for user_id, ingredient_id, total in (
+            ShoppingListItem.objects.live_totals().iterator()
+        ):
+            amount = stored.pop((user_id, ingredient_id), None)
+            if amount != total:
+                mismatches.append((user_id, ingredient_id, amount, total))
+        mismatches.extend(
+            (user_id, ingredient_id, amount, None)
+            for (user_id, ingredient_id), amount in stored.items()
+        )
+        return mismatches
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            with transaction.atomic():
+                ShoppingListItem.objects.rebuild(options['batch_size'])
+            self.stdout.write('Списки покупок пересобраны.')
+        mismatches = self.find_mismatches()
+        for user_id, ingredient_id, amount, total in mismatches:
+            self.stdout.write(
+                f'Пользователь {user_id}, ингредиент {ingredient_id}: '
+                f'в списке {amount}, по корзине {total}'
+            )
+        if mismatches:
+            raise CommandError(
+                f'Расхождений в списках покупок: {len(mismatches)}'
+            )
+        self.stdout.write('Списки покупок совпадают с корзинами.')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import TimelineEntry
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает ленты подписок: последние рецепты каждого автора '
+        'из подписок пользователя'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            TimelineEntry.objects.rebuild()
+        self.stdout.write(
+            f'Строк в лентах: {TimelineEntry.objects.count()}.'
+        )
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe, ShoppingСart
+from users.counters import adjust_counters
+from users.models import Subscription, User
+
+# (модель со счетчиком, поле счетчика, считаемая модель, ее внешний ключ)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'carts_count', ShoppingСart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет денормализованные счетчики с данными '
+        'и исправляет расхождения'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сверить счетчики, ничего не меняя',
+        )
+
+    def find_mismatches(self, model, field, counted_model, foreign_key):
+        actual = Coalesce(Subquery(
+            counted_model.objects.filter(
+                **{foreign_key: OuterRef('pk')}
+            ).order_by().values(foreign_key).annotate(
+                count=Count('pk')
+            ).values('count')
+        ), 0)
+        return list(
+            model.objects.annotate(
+                actual=actual
+            ).exclude(
+                **{field: F('actual')}
+            ).values_list('pk', field, 'actual')
+        )
+
+    def handle(self, *args, **options):
+        total = 0
+        with transaction.atomic():
+            for model, field, counted_model, foreign_key in COUNTERS:
+                mismatches = self.find_mismatches(
+                    model, field, counted_model, foreign_key
+                )
+                for pk, stored, actual in mismatches:
+                    self.stdout.write(
+                        f'{model._meta.verbose_name} {pk}, {field}: '
+                        f'записано {stored}, на самом деле {actual}'
+                    )
+                if mismatches and not options['check']:
+                    # Поправка, а не итоговое значение: изменения от
+                    # запросов после сверки меняют и счетчик, и данные,
+                    # поэтому разница между ними остается прежней.
+                    adjust_counters(model, field, {
+                        pk: actual - stored
+                        for pk, stored, actual in mismatches
+                    })
+                total += len(mismatches)
+        if total and options['check']:
+            raise CommandError(f'Расхождений в счетчиках: {total}')
+        if total:
+            self.stdout.write(f'Исправлено счетчиков: {total}.')
+        else:
+            self.stdout.write('Счетчики совпадают с данными.')
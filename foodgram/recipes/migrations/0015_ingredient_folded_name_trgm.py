@@ -0,0 +1,40 @@
+# Generated by Django 2.2.19 on 2026-10-17 08:05
+
+from django.db import migrations
+
+FOLDED_NAME = "replace(replace(name, 'ё', 'е'), 'Ё', 'Е')"
+
+
+def create_folded_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingredient_name_trgm'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_ingredient_folded_name_trgm '
+        f'ON recipes_ingredient USING gin (({FOLDED_NAME}) gin_trgm_ops)'
+    )
+
+
+def drop_folded_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'DROP INDEX IF EXISTS recipes_ingredient_folded_name_trgm'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+        'ON recipes_ingredient USING gin (name gin_trgm_ops)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_folded_index, drop_folded_index),
+    ]
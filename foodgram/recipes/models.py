@@ -1,6 +1,13 @@
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
-from users.models import User
+from django.db import connection, models, transaction
+from django.db.models import (Case, F, IntegerField, OuterRef, Subquery, Sum,
+                              Value, When)
+from users.counters import CountersMixin, adjust_counters
+from users.models import Subscription, User
 
 
 class Ingredient(models.Model):
@@ -48,8 +55,33 @@ class Tag(models.Model):
         verbose_name_plural = 'Теги'
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+
+    def with_details(self):
+        """Автор подгружается через JOIN, теги и ингредиенты -
+        отдельными запросами на все рецепты выборки."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            models.Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                )
+            )
+        )
+
+
+class Recipe(CountersMixin, models.Model):
     """Модель рецепта."""
+    IMAGE_PENDING = 'pending'
+    IMAGE_READY = 'ready'
+    IMAGE_FAILED = 'failed'
+    IMAGE_STATUSES = (
+        (IMAGE_PENDING, 'Обрабатывается'),
+        (IMAGE_READY, 'Готово'),
+        (IMAGE_FAILED, 'Ошибка обработки'),
+    )
+
     tags = models.ManyToManyField(
         Tag,
         related_name='recipes',
@@ -79,6 +111,12 @@ class Recipe(models.Model):
         upload_to='recipes/',
         verbose_name='Фото блюда'
     )
+    image_status = models.CharField(
+        max_length=10,
+        choices=IMAGE_STATUSES,
+        default=IMAGE_READY,
+        verbose_name='Обработка фото'
+    )
     text = models.TextField(
         verbose_name='Описание рецепта'
     )
@@ -86,12 +124,41 @@ class Recipe(models.Model):
         validators=[MinValueValidator(1), MaxValueValidator(600)],
         verbose_name='Время приготовления, мин.'
     )
+    favorites_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число добавлений в Избранное'
+    )
+    carts_count = models.IntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число добавлений в список покупок'
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+
+    counter_fields = ('favorites_count', 'carts_count')
+
+    objects = RecipeQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx',
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -122,6 +189,85 @@ class RecipeIngredient(models.Model):
         verbose_name_plural = 'Ингредиенты рецепта'
 
 
+class UserRecipeManager(models.Manager):
+    """Массовое добавление и удаление рецептов в избранном и корзине.
+
+    Строки вставляются и удаляются без сигналов моделей, поэтому
+    зависимые данные обновляет recipes_added/recipes_removed модели
+    один раз на всю пачку.
+    """
+
+    def add(self, user_id, recipe_id):
+        """Добавляет рецепт. Возвращает False, если рецепт уже добавлен
+        или его нет."""
+        return bool(self.add_many(user_id, [recipe_id]))
+
+    def remove(self, user_id, recipe_id):
+        """Удаляет рецепт. Возвращает False, если рецепта не было
+        в списке."""
+        return bool(self.remove_many(user_id, [recipe_id]))
+
+    def add_many(self, user_id, recipe_ids):
+        """Добавляет рецепты одним INSERT ... ON CONFLICT DO NOTHING.
+
+        Возвращает id рецептов, строки которых вставил именно этот
+        запрос: уже добавленные и несуществующие рецепты в него не
+        попадают, и параллельный запрос с теми же id их не повторит.
+        """
+        if not recipe_ids:
+            return set()
+        opts = self.model._meta
+        quote = connection.ops.quote_name
+        with transaction.atomic():
+            added = self.execute_returning(
+                'INSERT INTO {table} ({user}, {recipe}) '
+                'SELECT %s, {recipe_pk} FROM {recipes} '
+                'WHERE {recipe_pk} IN ({ids}) '
+                'ON CONFLICT DO NOTHING RETURNING {recipe}'.format(
+                    table=quote(opts.db_table),
+                    user=quote(opts.get_field('user').column),
+                    recipe=quote(opts.get_field('recipe').column),
+                    recipes=quote(Recipe._meta.db_table),
+                    recipe_pk=quote(Recipe._meta.pk.column),
+                    ids=', '.join(['%s'] * len(recipe_ids)),
+                ),
+                [user_id, *recipe_ids]
+            )
+            if added:
+                self.model.recipes_added(user_id, added)
+        return added
+
+    def remove_many(self, user_id, recipe_ids):
+        """Удаляет рецепты одним DELETE ... RETURNING.
+        Возвращает id рецептов, строки которых удалил этот запрос."""
+        if not recipe_ids:
+            return set()
+        opts = self.model._meta
+        quote = connection.ops.quote_name
+        with transaction.atomic():
+            removed = self.execute_returning(
+                'DELETE FROM {table} WHERE {user} = %s AND {recipe} IN '
+                '({ids}) RETURNING {recipe}'.format(
+                    table=quote(opts.db_table),
+                    user=quote(opts.get_field('user').column),
+                    recipe=quote(opts.get_field('recipe').column),
+                    ids=', '.join(['%s'] * len(recipe_ids)),
+                ),
+                [user_id, *recipe_ids]
+            )
+            if removed:
+                self.model.recipes_removed(user_id, removed)
+        return removed
+
+    @staticmethod
+    def execute_returning(sql, params):
+        """Выполняет запрос без сигналов моделей и возвращает множество
+        значений из RETURNING."""
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return {row[0] for row in cursor.fetchall()}
+
+
 class Favorite(models.Model):
     """Модель избранного."""
     recipe = models.ForeignKey(
@@ -137,9 +283,25 @@ class Favorite(models.Model):
         verbose_name='Пользователь'
     )
 
+    objects = UserRecipeManager()
+
     def __str__(self):
         return f'{self.user} добавил "{self.recipe}" в Избранное'
 
+    @staticmethod
+    def recipes_added(user_id, recipe_ids):
+        adjust_counters(
+            Recipe, 'favorites_count',
+            {recipe_id: 1 for recipe_id in recipe_ids}
+        )
+
+    @staticmethod
+    def recipes_removed(user_id, recipe_ids):
+        adjust_counters(
+            Recipe, 'favorites_count',
+            {recipe_id: -1 for recipe_id in recipe_ids}
+        )
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -167,9 +329,25 @@ class ShoppingСart(models.Model):
         verbose_name='Пользователь'
     )
 
+    objects = UserRecipeManager()
+
     def __str__(self):
         return f'{self.user} добавил "{self.recipe}" в список покупок.'
 
+    @staticmethod
+    def recipes_added(user_id, recipe_ids):
+        ShoppingListItem.objects.add_recipes(user_id, recipe_ids)
+        adjust_counters(
+            Recipe, 'carts_count', {recipe_id: 1 for recipe_id in recipe_ids}
+        )
+
+    @staticmethod
+    def recipes_removed(user_id, recipe_ids):
+        ShoppingListItem.objects.remove_recipes(user_id, recipe_ids)
+        adjust_counters(
+            Recipe, 'carts_count', {recipe_id: -1 for recipe_id in recipe_ids}
+        )
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -180,3 +358,404 @@ class ShoppingСart(models.Model):
 
         verbose_name = 'Покупка'
         verbose_name_plural = 'Покупки'
+
+
+class ShoppingListManager(models.Manager):
+    """Инкрементальное обновление сводного списка покупок."""
+
+    @staticmethod
+    def recipe_amounts(recipe_ids):
+        """Суммарное количество каждого ингредиента в рецептах."""
+        return dict(
+            RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids
+            ).values('ingredient_id').annotate(
+                total=Sum('amount')
+            ).values_list('ingredient_id', 'total')
+        )
+
+    def apply_delta(self, user_ids, delta):
+        """Прибавляет delta {ingredient_id: количество} к спискам
+        покупок пользователей и удаляет обнулившиеся строки."""
+        delta = {
+            ingredient_id: amount
+            for ingredient_id, amount in delta.items() if amount
+        }
+        user_ids = list(user_ids)
+        if not user_ids or not delta:
+            return
+        self.bulk_create(
+            [
+                self.model(user_id=user_id, ingredient_id=ingredient_id)
+                for user_id in user_ids
+                for ingredient_id, amount in delta.items() if amount > 0
+            ],
+            ignore_conflicts=True
+        )
+        items = self.filter(user_id__in=user_ids, ingredient_id__in=delta)
+        items.update(amount=F('amount') + Case(
+            *[
+                When(ingredient_id=ingredient_id, then=Value(amount))
+                for ingredient_id, amount in delta.items()
+            ],
+            output_field=IntegerField()
+        ))
+        if any(amount < 0 for amount in delta.values()):
+            items.filter(amount__lte=0).delete()
+
+    def add_recipes(self, user_id, recipe_ids):
+        """Учитывает рецепты, добавленные в корзину."""
+        self.apply_delta([user_id], self.recipe_amounts(recipe_ids))
+
+    def remove_recipes(self, user_id, recipe_ids):
+        """Учитывает рецепты, удаленные из корзины."""
+        self.apply_delta([user_id], {
+            ingredient_id: -amount
+            for ingredient_id, amount in self.recipe_amounts(
+                recipe_ids
+            ).items()
+        })
+
+    def change_recipe(self, recipe, old_amounts, new_amounts):
+        """Переносит изменение ингредиентов рецепта в списки покупок
+        всех пользователей, у которых он лежит в корзине."""
+        delta = {
+            ingredient_id: (
+                new_amounts.get(ingredient_id, 0)
+                - old_amounts.get(ingredient_id, 0)
+            )
+            for ingredient_id in set(old_amounts) | set(new_amounts)
+        }
+        if not any(delta.values()):
+            return
+        self.apply_delta(
+            ShoppingСart.objects.filter(
+                recipe=recipe
+            ).values_list('user_id', flat=True),
+            delta
+        )
+
+    @staticmethod
+    def live_totals():
+        """Список покупок, посчитанный заново по корзинам."""
+        return RecipeIngredient.objects.filter(
+            recipe__shopping_cart__isnull=False
+        ).values(
+            'ingredient_id',
+            cart_user_id=F('recipe__shopping_cart__user'),
+        ).annotate(
+            total=Sum('amount')
+        ).values_list('cart_user_id', 'ingredient_id', 'total')
+
+    def rebuild(self, batch_size=1000):
+        """Пересоздает сводные списки покупок всех пользователей."""
+        self.all().delete()
+        totals = self.live_totals().iterator()
+        while True:
+            batch = [
+                self.model(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    amount=total
+                )
+                for user_id, ingredient_id, total in islice(
+                    totals, batch_size
+                )
+            ]
+            if not batch:
+                break
+            self.bulk_create(batch)
+
+
+class ShoppingListItem(models.Model):
+    """Модель сводного списка покупок.
+    Хранит сумму ингредиента по всем рецептам в корзине пользователя.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Ингредиент'
+    )
+    amount = models.IntegerField(
+        default=0,
+        verbose_name='Количество'
+    )
+
+    objects = ShoppingListManager()
+
+    def __str__(self):
+        return f'{self.ingredient} - {self.amount} для {self.user}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_item',
+            )
+        ]
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Списки покупок'
+
+
+class TimelineManager(models.Manager):
+    """Ленты новых рецептов авторов из подписок.
+
+    Рецепт автора, у которого не больше FEED_FANOUT_MAX_SUBSCRIBERS
+    подписчиков, раскладывается по лентам подписчиков при публикации.
+    Рецепты более популярных авторов каждый читатель забирает в свою
+    ленту сам при открытии первой страницы, поэтому публикация у них
+    не пишет строку на каждого подписчика.
+    """
+
+    def names(self):
+        """Имена таблиц и столбцов для сырых запросов."""
+        quote = connection.ops.quote_name
+        opts = self.model._meta
+        subscriptions = Subscription._meta
+        return {
+            'timeline': quote(opts.db_table),
+            'user': quote(opts.get_field('user').column),
+            'recipe': quote(opts.get_field('recipe').column),
+            'author': quote(opts.get_field('author').column),
+            'pub_date': quote(opts.get_field('pub_date').column),
+            'recipes': quote(Recipe._meta.db_table),
+            'recipe_author': quote(Recipe._meta.get_field('author').column),
+            'subscriptions': quote(subscriptions.db_table),
+            'subscriber': quote(
+                subscriptions.get_field('subscriber').column
+            ),
+            'followed': quote(subscriptions.get_field('author').column),
+            'users': quote(User._meta.db_table),
+            'subscribers_count': quote(
+                User._meta.get_field('subscribers_count').column
+            ),
+        }
+
+    def fan_out(self, recipe_id):
+        """Добавляет рецепт в ленты подписчиков автора одним INSERT,
+        если автор не превысил порог подписчиков."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {timeline} '
+                '({user}, {recipe}, {author}, {pub_date}) '
+                'SELECT s.{subscriber}, r.id, r.{recipe_author}, '
+                'r.{pub_date} '
+                'FROM {recipes} r '
+                'JOIN {users} u ON u.id = r.{recipe_author} '
+                'JOIN {subscriptions} s ON s.{followed} = r.{recipe_author} '
+                'WHERE r.id = %s AND u.{subscribers_count} <= %s '
+                'ON CONFLICT DO NOTHING'.format(**self.names()),
+                [recipe_id, settings.FEED_FANOUT_MAX_SUBSCRIBERS]
+            )
+            return cursor.rowcount
+
+    def backfill(self, user_id, author_id):
+        """Добавляет в ленту последние FEED_BACKFILL_LIMIT рецептов
+        автора, на которого подписался пользователь."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {timeline} '
+                '({user}, {recipe}, {author}, {pub_date}) '
+                'SELECT %s, id, {recipe_author}, {pub_date} FROM {recipes} '
+                'WHERE {recipe_author} = %s '
+                'ORDER BY {pub_date} DESC, id DESC LIMIT %s '
+                'ON CONFLICT DO NOTHING'.format(**self.names()),
+                [user_id, author_id, settings.FEED_BACKFILL_LIMIT]
+            )
+
+    def prune(self, user_id, author_id):
+        """Убирает из ленты рецепты автора после отписки."""
+        self.filter(user_id=user_id, author_id=author_id).delete()
+
+    def pull(self, user_id):
+        """Забирает в ленту рецепты популярных авторов из подписок,
+        опубликованные после последнего рецепта автора в ленте.
+        От каждого автора берутся не больше FEED_BACKFILL_LIMIT самых
+        новых, как при подписке, поэтому читатель после долгого
+        перерыва не вставляет в ленту весь новый архив автора."""
+        latest = self.filter(
+            user_id=user_id, author_id=OuterRef('author_id')
+        ).order_by('-pub_date').values('pub_date')[:1]
+        watermarks = Subscription.objects.filter(
+            subscriber_id=user_id,
+            author__subscribers_count__gt=(
+                settings.FEED_FANOUT_MAX_SUBSCRIBERS
+            ),
+        ).annotate(
+            latest=Subquery(latest)
+        ).values_list('author_id', 'latest')
+        names = self.names()
+        conditions = []
+        params = []
+        for author_id, latest in watermarks:
+            if latest is None:
+                self.backfill(user_id, author_id)
+                continue
+            conditions.append(
+                '({recipe_author} = %s AND {pub_date} > %s)'.format(**names)
+            )
+            params.extend([author_id, latest])
+        if not conditions:
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {timeline} '
+                '({user}, {recipe}, {author}, {pub_date}) '
+                'SELECT %s, id, author_id, pub_date FROM ('
+                'SELECT id, {recipe_author} AS author_id, '
+                '{pub_date} AS pub_date, ROW_NUMBER() OVER ('
+                'PARTITION BY {recipe_author} '
+                'ORDER BY {pub_date} DESC, id DESC) AS position '
+                'FROM {recipes} WHERE {conditions}) ranked '
+                'WHERE position <= %s '
+                'ON CONFLICT DO NOTHING'.format(
+                    conditions=' OR '.join(conditions), **names
+                ),
+                [user_id, *params, settings.FEED_BACKFILL_LIMIT]
+            )
+
+    def rebuild(self):
+        """Пересоздает ленты всех пользователей: в каждой остаются
+        последние FEED_BACKFILL_LIMIT рецептов каждого автора из
+        подписок."""
+        self.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {timeline} '
+                '({user}, {recipe}, {author}, {pub_date}) '
+                'SELECT s.{subscriber}, latest.id, latest.author_id, '
+                'latest.pub_date FROM {subscriptions} s JOIN ('
+                'SELECT id, author_id, pub_date FROM ('
+                'SELECT id, {recipe_author} AS author_id, '
+                '{pub_date} AS pub_date, ROW_NUMBER() OVER ('
+                'PARTITION BY {recipe_author} '
+                'ORDER BY {pub_date} DESC, id DESC) AS position '
+                'FROM {recipes}) ranked WHERE position <= %s'
+                ') latest ON latest.author_id = s.{followed}'.format(
+                    **self.names()
+                ),
+                [settings.FEED_BACKFILL_LIMIT]
+            )
+
+
+class TimelineEntry(models.Model):
+    """Модель строки ленты: рецепт автора, на которого подписан
+    пользователь. Автор и дата публикации повторяют поля рецепта,
+    чтобы страница ленты читалась одним проходом по индексу."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='timeline',
+        verbose_name='Читатель'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации'
+    )
+
+    objects = TimelineManager()
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='timeline_user_pub_date_idx',
+            ),
+            models.Index(
+                fields=['user', 'author', '-pub_date'],
+                name='timeline_user_author_idx',
+            ),
+        ]
+        verbose_name = 'Строка ленты'
+        verbose_name_plural = 'Ленты подписок'
+
+
+class SimilarRecipe(models.Model):
+    """Модель соседа рецепта: один из SIMILAR_RECIPES_LIMIT рецептов,
+    ближайших к нему по набору ингредиентов."""
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        db_index=False,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(
+        verbose_name='Сходство'
+    )
+
+    def __str__(self):
+        return f'{self.similar} похож на {self.recipe}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_similar_recipe',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx',
+            )
+        ]
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+
+class DataVersion(models.Model):
+    """Версия справочника, по которой кешируются его ответы.
+
+    Хранится в базе, чтобы изменения из любого процесса, в том числе
+    из команд в отдельном контейнере, сразу видели все остальные.
+    """
+    name = models.CharField(
+        max_length=50,
+        primary_key=True,
+        verbose_name='Справочник'
+    )
+    version = models.BigIntegerField(
+        verbose_name='Версия'
+    )
+
+    def __str__(self):
+        return f'{self.name}: {self.version}'
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
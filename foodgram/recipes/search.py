@@ -0,0 +1,285 @@
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from operator import itemgetter
+
+from django.conf import settings
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, TrigramSimilarity)
+from django.db import connection, transaction
+from django.db.models import Case, F, IntegerField, Q, Value, When
+from django.db.models.functions import Replace
+
+from .models import Ingredient, Recipe
+from .versions import INGREDIENTS, get_data_version
+
+WORD_RE = re.compile(r'\w+')
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+# Окончания, которые отбрасываются перед префиксным поиском в SQLite,
+# от длинных к коротким. Это грубая замена русского стеммера Postgres.
+RUSSIAN_ENDINGS = (
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими',
+    'ов', 'ев', 'ей', 'ой', 'ый', 'ий', 'ая', 'яя', 'ое', 'ее', 'ые',
+    'ие', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ую', 'юю',
+    'а', 'я', 'ы', 'и', 'у', 'ю', 'е', 'о', 'ь', 'й',
+)
+MIN_STEM_LENGTH = 3
+# SQLite ранжирует совпадения отдельным запросом к FTS5 и отдает
+# не больше стольких рецептов; в Postgres ограничения нет.
+FTS_RESULTS_LIMIT = 1000
+
+
+def normalize(text):
+    """Приводит строку к виду для поиска: регистр и ё не важны."""
+    return text.casefold().replace('ё', 'е').strip()
+
+
+def folded_name():
+    """Название ингредиента с ё, замененной на е, как в normalize().
+    По этому выражению построен триграммный индекс в PostgreSQL,
+    регистр pg_trgm не различает сам."""
+    return Replace(
+        Replace(F('name'), Value('ё'), Value('е')), Value('Ё'), Value('Е')
+    )
+
+
+def trigrams(text):
+    """Триграммы строки по правилам pg_trgm: каждое слово дополняется
+    двумя пробелами в начале и одним в конце."""
+    result = set()
+    for word in WORD_RE.findall(normalize(text)):
+        word = f'  {word} '
+        result.update(word[i:i + 3] for i in range(len(word) - 2))
+    return result
+
+
+class IngredientIndex:
+    """Индекс ингредиентов в памяти процесса.
+
+    Хранит отсортированные нормализованные названия. Поиск по префиксу
+    идет бинарным поиском, совпадения внутри названия идут следом.
+    Для нечеткого поиска строится обратный индекс по триграммам.
+    Индекс перестраивается при смене версии справочника ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = ((), (), (), {})
+
+    def _build(self):
+        rows = Ingredient.objects.values_list(
+            'id', 'name', 'measurement_unit'
+        )
+        entries = sorted(
+            (
+                (normalize(name), {
+                    'id': pk,
+                    'name': name,
+                    'measurement_unit': measurement_unit,
+                })
+                for pk, name, measurement_unit in rows
+            ),
+            key=itemgetter(0)
+        )
+        keys = tuple(key for key, _ in entries)
+        items = tuple(item for _, item in entries)
+        sizes = []
+        postings = defaultdict(list)
+        for position, key in enumerate(keys):
+            key_trigrams = trigrams(key)
+            sizes.append(len(key_trigrams))
+            for trigram in key_trigrams:
+                postings[trigram].append(position)
+        return keys, items, tuple(sizes), dict(postings)
+
+    def refresh(self):
+        """Перестраивает индекс, если справочник изменился."""
+        version = get_data_version(INGREDIENTS)
+        if version == self._version:
+            return
+        with self._lock:
+            if version != self._version:
+                self._entries = self._build()
+                self._version = version
+
+    def search(self, query):
+        """Ингредиенты, название которых начинается с query,
+        затем содержащие query внутри названия."""
+        self.refresh()
+        keys, items, _, _ = self._entries
+        query = normalize(query)
+        if not query:
+            return list(items)
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        return list(items[start:end]) + [
+            item for key, item in zip(keys, items)
+            if query in key and not key.startswith(query)
+        ]
+
+    def fuzzy_search(self, query, threshold, limit):
+        """Ингредиенты с триграммным сходством не ниже threshold,
+        от более похожих к менее похожим."""
+        self.refresh()
+        _, items, sizes, postings = self._entries
+        query_trigrams = trigrams(query)
+        common = defaultdict(int)
+        for trigram in query_trigrams:
+            for position in postings.get(trigram, ()):
+                common[position] += 1
+        scored = []
+        for position, shared in common.items():
+            similarity = shared / (
+                len(query_trigrams) + sizes[position] - shared
+            )
+            if similarity >= threshold:
+                scored.append((-similarity, position))
+        scored.sort()
+        return [items[position] for _, position in scored[:limit]]
+
+
+ingredient_index = IngredientIndex()
+
+
+def fuzzy_search_ingredients(query):
+    """Нечеткий поиск ингредиентов.
+
+    В PostgreSQL используется pg_trgm, в остальных базах и при
+    INGREDIENT_FUZZY_BACKEND = 'memory' - индекс в памяти.
+    """
+    threshold = settings.INGREDIENT_FUZZY_THRESHOLD
+    limit = settings.INGREDIENT_FUZZY_LIMIT
+    backend = settings.INGREDIENT_FUZZY_BACKEND
+    if backend == 'auto':
+        backend = (
+            'postgres' if connection.vendor == 'postgresql' else 'memory'
+        )
+    if backend == 'memory':
+        return ingredient_index.fuzzy_search(query, threshold, limit)
+    query = normalize(query)
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Оператор % (trigram_similar) идет по индексу и берет порог
+        # из pg_trgm.similarity_threshold; similarity() только
+        # упорядочивает найденное.
+        cursor.execute(
+            "SELECT set_config('pg_trgm.similarity_threshold', %s, true)",
+            [str(threshold)]
+        )
+        return list(
+            Ingredient.objects.annotate(
+                folded_name=folded_name(),
+                similarity=TrigramSimilarity(folded_name(), query),
+            ).filter(
+                folded_name__trigram_similar=query
+            ).order_by('-similarity', 'name').values(
+                'id', 'name', 'measurement_unit'
+            )[:limit]
+        )
+
+
+def light_stem(word):
+    """Отрезает от слова типичное окончание, оставляя не меньше
+    MIN_STEM_LENGTH букв."""
+    for ending in RUSSIAN_ENDINGS:
+        if (word.endswith(ending)
+                and len(word) - len(ending) >= MIN_STEM_LENGTH):
+            return word[:-len(ending)]
+    return word
+
+
+def recipe_search_vector():
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def index_recipes(recipe_ids=None):
+    """Обновляет поисковый индекс для рецептов recipe_ids
+    (для всех рецептов, если None)."""
+    recipes = Recipe.objects.all()
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+    if connection.vendor == 'postgresql':
+        recipes.update(search_vector=recipe_search_vector())
+    elif connection.vendor == 'sqlite':
+        rows = [
+            (pk, normalize(name), normalize(text))
+            for pk, name, text in recipes.values_list('id', 'name', 'text')
+        ]
+        with connection.cursor() as cursor:
+            if recipe_ids is None:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            else:
+                cursor.executemany(
+                    f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                    [(pk,) for pk in recipe_ids]
+                )
+            cursor.executemany(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                'VALUES (%s, %s, %s)',
+                rows
+            )
+
+
+def unindex_recipe(recipe_id):
+    """Удаляет рецепт из поискового индекса SQLite. В Postgres вектор
+    хранится в строке рецепта и удаляется вместе с ней."""
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe_id]
+            )
+
+
+def fts_match_query(query):
+    """Запрос FTS5: все слова запроса как префиксы их основ."""
+    return ' '.join(
+        '"{}"*'.format(light_stem(word))
+        for word in WORD_RE.findall(normalize(query))
+    )
+
+
+def search_recipes(queryset, query):
+    """Рецепты из queryset, подходящие под запрос, от более
+    релевантных к менее релевантным.
+
+    Совпадения в названии весят больше, чем в описании. В Postgres
+    используется search_vector с GIN-индексом, в SQLite - таблица FTS5,
+    из которой берутся только FTS_RESULTS_LIMIT лучших совпадений.
+    """
+    if not WORD_RE.search(query):
+        return queryset
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, config=SEARCH_CONFIG)
+        return queryset.annotate(
+            rank=SearchRank(F('search_vector'), search_query)
+        ).filter(
+            search_vector=search_query
+        ).order_by('-rank', '-pub_date')
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY bm25({FTS_TABLE}, 10.0, 1.0) LIMIT %s',
+                [fts_match_query(query), FTS_RESULTS_LIMIT]
+            )
+            ids = [pk for pk, in cursor.fetchall()]
+        if not ids:
+            return queryset.none()
+        return queryset.filter(pk__in=ids).order_by(
+            Case(
+                *(When(pk=pk, then=position)
+                  for position, pk in enumerate(ids)),
+                output_field=IntegerField(),
+            )
+        )
+    return queryset.filter(
+        Q(name__icontains=query) | Q(text__icontains=query)
+    )
@@ -0,0 +1,61 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from users.counters import adjust_counters
+from users.models import Subscription, User, subscribed, unsubscribed
+
+from .models import (Favorite, Ingredient, Recipe, ShoppingСart, Tag,
+                     TimelineEntry)
+from .search import index_recipes, unindex_recipe
+from .tasks import schedule_fan_out
+from .versions import INGREDIENTS, TAGS, bump_data_version
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingСart)
+def user_recipe_added(sender, instance, created, **kwargs):
+    if created:
+        sender.recipes_added(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(pre_delete, sender=ShoppingСart)
+def user_recipe_removed(sender, instance, **kwargs):
+    """Корзина обрабатывается до удаления: при удалении самого рецепта
+    его ингредиенты нужны, чтобы вычесть их из списков покупок."""
+    sender.recipes_removed(instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredients_changed(sender, **kwargs):
+    bump_data_version(INGREDIENTS)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tags_changed(sender, **kwargs):
+    bump_data_version(TAGS)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, created, **kwargs):
+    index_recipes([instance.pk])
+    if created:
+        adjust_counters(User, 'recipes_count', {instance.author_id: 1})
+        schedule_fan_out(instance)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    unindex_recipe(instance.pk)
+    adjust_counters(User, 'recipes_count', {instance.author_id: -1})
+
+
+@receiver(subscribed, sender=Subscription)
+def author_followed(sender, subscriber_id, author_id, **kwargs):
+    TimelineEntry.objects.backfill(subscriber_id, author_id)
+
+
+@receiver(unsubscribed, sender=Subscription)
+def author_unfollowed(sender, subscriber_id, author_id, **kwargs):
+    TimelineEntry.objects.prune(subscriber_id, author_id)
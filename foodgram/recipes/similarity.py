@@ -0,0 +1,184 @@
+import heapq
+import math
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .models import Recipe, RecipeIngredient, SimilarRecipe
+
+# Сколько рецептов-кандидатов сравнивается с рецептом. Кандидаты
+# набираются по его самым редким ингредиентам: совпадение по редкому
+# ингредиенту весит больше, чем по соли или сахару.
+CANDIDATES_LIMIT = 300
+
+
+class IngredientSpace:
+    """Наборы ингредиентов рецептов с весами IDF.
+
+    Сходство рецептов - взвешенный коэффициент Жаккара: сумма весов
+    общих ингредиентов, деленная на сумму весов ингредиентов обоих
+    рецептов. Ингредиент, который есть почти везде, весит мало.
+    """
+
+    def __init__(self, vectors, frequencies, total):
+        self.vectors = vectors
+        self.weights = {
+            ingredient_id: math.log(1 + total / frequency)
+            for ingredient_id, frequency in frequencies.items()
+        }
+        self.totals = {}
+
+    def weight(self, ingredients):
+        return sum(self.weights[ingredient] for ingredient in ingredients)
+
+    def total(self, recipe_id):
+        if recipe_id not in self.totals:
+            self.totals[recipe_id] = self.weight(self.vectors[recipe_id])
+        return self.totals[recipe_id]
+
+    def similarity(self, left, right):
+        common = self.weight(self.vectors[left] & self.vectors[right])
+        if not common:
+            return 0.0
+        return common / (self.total(left) + self.total(right) - common)
+
+    def neighbours(self, recipe_id, candidates):
+        """Ближайшие рецепты из candidates: [(recipe_id, score)]."""
+        scores = (
+            (self.similarity(recipe_id, candidate), candidate)
+            for candidate in candidates if candidate != recipe_id
+        )
+        return [
+            (candidate, score)
+            for score, candidate in heapq.nlargest(
+                settings.SIMILAR_RECIPES_LIMIT, scores
+            )
+            if score > 0
+        ]
+
+
+def ingredient_frequencies(ingredient_ids):
+    """Число рецептов с каждым ингредиентом."""
+    return dict(
+        RecipeIngredient.objects.filter(
+            ingredient_id__in=ingredient_ids
+        ).values('ingredient_id').annotate(
+            recipes=Count('id')
+        ).values_list('ingredient_id', 'recipes')
+    )
+
+
+def recipe_vectors(recipe_ids):
+    vectors = defaultdict(set)
+    for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list('recipe_id', 'ingredient_id'):
+        vectors[recipe_id].add(ingredient_id)
+    return vectors
+
+
+def build_similar_recipes(batch_size=5000):
+    """Пересчитывает соседей всех рецептов. Наборы ингредиентов
+    и обратный индекс по ингредиентам держатся в памяти."""
+    vectors = defaultdict(set)
+    postings = defaultdict(list)
+    for recipe_id, ingredient_id in RecipeIngredient.objects.values_list(
+        'recipe_id', 'ingredient_id'
+    ).iterator():
+        vectors[recipe_id].add(ingredient_id)
+        postings[ingredient_id].append(recipe_id)
+    space = IngredientSpace(
+        vectors,
+        {ingredient_id: len(ids) for ingredient_id, ids in postings.items()},
+        len(vectors)
+    )
+
+    def candidates(ingredients):
+        pool = set()
+        for ingredient_id in sorted(
+            ingredients, key=lambda ingredient: len(postings[ingredient])
+        ):
+            pool.update(islice(
+                postings[ingredient_id], CANDIDATES_LIMIT - len(pool)
+            ))
+            if len(pool) >= CANDIDATES_LIMIT:
+                break
+        return pool
+
+    rows = (
+        SimilarRecipe(recipe_id=recipe_id, similar_id=similar_id, score=score)
+        for recipe_id, ingredients in vectors.items()
+        for similar_id, score in space.neighbours(
+            recipe_id, candidates(ingredients)
+        )
+    )
+    with transaction.atomic():
+        SimilarRecipe.objects.all().delete()
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            SimilarRecipe.objects.bulk_create(batch)
+
+
+def update_similar_recipes(recipe_id):
+    """Пересчитывает соседей рецепта после правки его ингредиентов.
+
+    Списки других рецептов правятся точечно: рецепт добавляется в них
+    с новым сходством или убирается оттуда. Рецепт, выбывший из чужого
+    списка, не заменяется следующим по сходству до полной пересборки
+    командой build_similar_recipes.
+    """
+    ingredients = set(RecipeIngredient.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('ingredient_id', flat=True))
+    if not ingredients:
+        return
+    frequencies = ingredient_frequencies(ingredients)
+    pool = set()
+    for ingredient_id in sorted(ingredients, key=frequencies.get):
+        pool.update(RecipeIngredient.objects.filter(
+            ingredient_id=ingredient_id
+        ).values_list('recipe_id', flat=True)[:CANDIDATES_LIMIT - len(pool)])
+        if len(pool) >= CANDIDATES_LIMIT:
+            break
+    pool.discard(recipe_id)
+    others = pool | set(SimilarRecipe.objects.filter(
+        similar_id=recipe_id
+    ).values_list('recipe_id', flat=True))
+    vectors = recipe_vectors(others)
+    vectors[recipe_id] = ingredients
+    frequencies.update(ingredient_frequencies(
+        set().union(*vectors.values()) - frequencies.keys()
+    ))
+    space = IngredientSpace(vectors, frequencies, Recipe.objects.count())
+    lists = {recipe_id: dict(space.neighbours(recipe_id, pool))}
+    stored = defaultdict(dict)
+    for other_id, similar_id, score in SimilarRecipe.objects.filter(
+        recipe_id__in=others
+    ).values_list('recipe_id', 'similar_id', 'score'):
+        stored[other_id][similar_id] = score
+    for other_id in others:
+        neighbours = dict(stored[other_id])
+        neighbours.pop(recipe_id, None)
+        score = space.similarity(other_id, recipe_id)
+        if score > 0:
+            neighbours[recipe_id] = score
+        neighbours = dict(heapq.nlargest(
+            settings.SIMILAR_RECIPES_LIMIT,
+            neighbours.items(),
+            key=lambda item: item[1]
+        ))
+        if neighbours != stored[other_id]:
+            lists[other_id] = neighbours
+    with transaction.atomic():
+        SimilarRecipe.objects.filter(recipe_id__in=lists).delete()
+        SimilarRecipe.objects.bulk_create(
+            SimilarRecipe(recipe_id=owner_id, similar_id=similar_id,
+                          score=score)
+            for owner_id, neighbours in lists.items()
+            for similar_id, score in neighbours.items()
+        )
@@ -0,0 +1,56 @@
+from jobs.queue import PermanentJobError, enqueue, task
+
+from .images import generate_variants, normalize_image
+from .models import Recipe, TimelineEntry
+from .similarity import update_similar_recipes
+
+
+@task('recipes.process_image')
+def process_image(recipe_id):
+    """Нормализует фото рецепта и создает его уменьшенные копии."""
+    recipe = Recipe.objects.filter(pk=recipe_id).only('id', 'image').first()
+    if recipe is None:
+        return
+    try:
+        name = normalize_image(recipe.image)
+        generate_variants(recipe.image, force=True)
+    except ValueError as err:
+        Recipe.objects.filter(pk=recipe_id).update(
+            image_status=Recipe.IMAGE_FAILED
+        )
+        raise PermanentJobError(err)
+    Recipe.objects.filter(pk=recipe_id).update(
+        image=name, image_status=Recipe.IMAGE_READY
+    )
+
+
+def schedule_image_processing(recipe):
+    """Отправляет новое фото рецепта на обработку в фоне."""
+    recipe.image_status = Recipe.IMAGE_PENDING
+    Recipe.objects.filter(pk=recipe.pk).update(
+        image_status=Recipe.IMAGE_PENDING
+    )
+    enqueue('recipes.process_image', recipe_id=recipe.pk)
+
+
+@task('recipes.fan_out_recipe')
+def fan_out_recipe(recipe_id):
+    """Раскладывает новый рецепт по лентам подписчиков автора."""
+    TimelineEntry.objects.fan_out(recipe_id)
+
+
+def schedule_fan_out(recipe):
+    """Отправляет новый рецепт в ленты подписчиков в фоне."""
+    enqueue('recipes.fan_out_recipe', recipe_id=recipe.pk)
+
+
+@task('recipes.update_similar_recipes')
+def update_similar(recipe_id):
+    """Пересчитывает похожие рецепты после правки ингредиентов."""
+    update_similar_recipes(recipe_id)
+
+
+def schedule_similarity_update(recipe):
+    """Отправляет рецепт с новым набором ингредиентов на пересчет
+    похожих рецептов в фоне."""
+    enqueue('recipes.update_similar_recipes', recipe_id=recipe.pk)
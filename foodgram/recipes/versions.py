@@ -0,0 +1,47 @@
+import time
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+INGREDIENTS = 'ingredients'
+TAGS = 'tags'
+
+
+def _initial_version():
+    # Новая запись начинает с текущего времени в микросекундах, поэтому
+    # после пересоздания базы версии не повторяют прежние ключи кеша.
+    return int(time.time() * 1_000_000)
+
+
+def get_data_version(name):
+    """Версия справочника, меняется при каждом его изменении.
+
+    Одним запросом по первичному ключу; запись создается при первом
+    обращении.
+    """
+    version = DataVersion.objects.filter(name=name).values_list(
+        'version', flat=True
+    ).first()
+    if version is None:
+        version = _create_version(name)
+    return version
+
+
+def bump_data_version(name):
+    """Отмечает изменение справочника."""
+    if not DataVersion.objects.filter(name=name).update(
+        version=F('version') + 1
+    ):
+        _create_version(name)
+
+
+def _create_version(name):
+    try:
+        with transaction.atomic():
+            return DataVersion.objects.create(
+                name=name, version=_initial_version()
+            ).version
+    except IntegrityError:
+        return DataVersion.objects.get(name=name).version
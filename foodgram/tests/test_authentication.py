@@ -0,0 +1,23 @@
+from django.core.cache import cache
+from django.test import TestCase
+from users.models import User
+
+from .utils import auth_client, create_user
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('reader')
+        self.client = auth_client(self.user)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+
+    def test_cached_token_reads_current_user(self):
+        User.objects.filter(pk=self.user.pk).update(first_name='Другое')
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.data['first_name'], 'Другое')
+
+    def test_cached_token_of_deactivated_user_is_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
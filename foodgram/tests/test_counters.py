@@ -0,0 +1,52 @@
+from io import StringIO
+
+from django.test import TestCase
+from recipes.management.commands import reconcile_counters
+from recipes.models import Favorite, Recipe
+from users.models import Subscription, User
+
+from .utils import create_recipe, create_user
+
+
+class ReconcileCountersTests(TestCase):
+
+    def test_fix_keeps_concurrent_increments(self):
+        author = create_user('author')
+        recipe = create_recipe(author)
+        readers = [create_user(f'reader{number}') for number in range(3)]
+        Favorite.objects.add(readers[0].id, recipe.id)
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=5)
+
+        class Command(reconcile_counters.Command):
+            def find_mismatches(self, *args):
+                mismatches = super().find_mismatches(*args)
+                # Запрос пользователя между сверкой и исправлением.
+                Favorite.objects.add(readers[1].id, recipe.id)
+                return mismatches
+
+        Command(stdout=StringIO()).handle(check=False)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 2)
+
+
+class CounterSaveTests(TestCase):
+
+    def test_saving_stale_instances_keeps_counters(self):
+        author = create_user('author')
+        reader = create_user('reader')
+        recipe = create_recipe(author)
+        stale_recipe = Recipe.objects.get(pk=recipe.pk)
+        stale_author = User.objects.get(pk=author.pk)
+        Favorite.objects.add(reader.id, recipe.id)
+        Subscription.objects.subscribe(reader.id, author.id)
+        stale_recipe.name = 'Новое название'
+        stale_recipe.save()
+        stale_author.first_name = 'Новое имя'
+        stale_author.save()
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(author.first_name, 'Новое имя')
+        self.assertEqual(author.subscribers_count, 1)
+        self.assertEqual(author.recipes_count, 1)
@@ -0,0 +1,40 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from recipes.models import Ingredient
+from recipes.search import fuzzy_search_ingredients
+
+QUERIES = ('мед', 'мёд', 'Медовик', 'ежевика', 'ёжевика', 'малоко')
+
+
+class FuzzyIngredientSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('Мёд', 'Медовик', 'Ежевика', 'Молоко', 'Соль'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def search(self, backend, query):
+        with override_settings(INGREDIENT_FUZZY_BACKEND=backend):
+            return [
+                ingredient['name']
+                for ingredient in fuzzy_search_ingredients(query)
+            ]
+
+    def test_memory_index_ignores_yo(self):
+        self.assertEqual(self.search('memory', 'мед')[0], 'Мёд')
+        self.assertEqual(
+            self.search('memory', 'ёжевика'), self.search('memory', 'ежевика')
+        )
+
+    @skipUnless(connection.vendor == 'postgresql', 'нужен pg_trgm')
+    def test_postgres_matches_memory_index(self):
+        for query in QUERIES:
+            with self.subTest(query=query):
+                # Порядок при равном сходстве зависит от сортировки
+                # названий в базе, поэтому сравниваются наборы.
+                self.assertEqual(
+                    set(self.search('postgres', query)),
+                    set(self.search('memory', query))
+                )
@@ -0,0 +1,96 @@
+from datetime import timedelta
+from io import BytesIO
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.test import TestCase
+from django.utils import timezone
+from jobs.models import Job
+from jobs.queue import claim, claim_next, enqueue, run_claimed
+from PIL import Image
+from recipes.models import Recipe
+from recipes.tasks import process_image
+
+from .utils import TempMediaMixin, create_recipe, create_user
+
+
+class ClaimTests(TestCase):
+
+    def test_stale_job_is_claimed_once(self):
+        job = Job.objects.create(
+            name='recipes.process_image',
+            status=Job.RUNNING,
+            attempts=1,
+            started=timezone.now() - timedelta(days=1),
+        )
+        first = Job.objects.get(pk=job.pk)
+        second = Job.objects.get(pk=job.pk)
+        self.assertIsNotNone(claim(first))
+        self.assertIsNone(claim(second))
+        self.assertEqual(Job.objects.get(pk=job.pk).attempts, 2)
+
+
+def jpeg(size, exif=None):
+    buffer = BytesIO()
+    options = {'exif': exif} if exif is not None else {}
+    Image.new('RGB', size, (30, 120, 200)).save(buffer, 'JPEG', **options)
+    return buffer.getvalue()
+
+
+class ImageJobTests(TempMediaMixin, TestCase):
+
+    def recipe_with_image(self, name, content):
+        recipe = create_recipe(create_user('author'))
+        name = default_storage.save(name, ContentFile(content))
+        Recipe.objects.filter(pk=recipe.pk).update(image=name)
+        return recipe
+
+    def test_broken_image_fails_without_retry(self):
+        recipe = self.recipe_with_image('recipes/broken.png', b'not an image')
+        Job.objects.all().delete()
+        job = enqueue('recipes.process_image', recipe_id=recipe.pk)
+        with self.assertLogs('jobs.queue', 'WARNING'):
+            run_claimed(claim_next())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(job.attempts, 1)
+        self.assertEqual(
+            Recipe.objects.get(pk=recipe.pk).image_status,
+            Recipe.IMAGE_FAILED
+        )
+
+    def test_normalized_image_is_not_encoded_again(self):
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        recipe = self.recipe_with_image(
+            'recipes/photo.jpg', jpeg((3000, 1000), exif.tobytes())
+        )
+        process_image(recipe.pk)
+        name = Recipe.objects.get(pk=recipe.pk).image.name
+        with default_storage.open(name, 'rb') as file:
+            normalized = file.read()
+        self.assertEqual(Image.open(BytesIO(normalized)).size, (683, 2048))
+        process_image(recipe.pk)
+        with default_storage.open(name, 'rb') as file:
+            self.assertEqual(file.read(), normalized)
+
+    def test_renamed_file_is_stored_in_recipe(self):
+        recipe = self.recipe_with_image(
+            'recipes/large.jpg', jpeg((3000, 1000))
+        )
+        available_name = FileSystemStorage.get_available_name
+
+        def rename(storage, name, max_length=None):
+            if name.startswith('recipes/'):
+                name = name.replace('.jpg', '_normalized.jpg')
+            return available_name(storage, name, max_length)
+
+        with mock.patch.object(
+            FileSystemStorage, 'get_available_name', rename
+        ):
+            process_image(recipe.pk)
+        recipe = Recipe.objects.get(pk=recipe.pk)
+        self.assertEqual(recipe.image.name, 'recipes/large_normalized.jpg')
+        self.assertTrue(default_storage.exists(recipe.image.name))
+        self.assertEqual(recipe.image_status, Recipe.IMAGE_READY)
@@ -0,0 +1,107 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+from django.test import TestCase
+from recipes.models import Recipe, TimelineEntry
+from users.models import Subscription
+
+from .utils import auth_client, create_recipe, create_user
+
+BASE_DATE = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class KeysetPaginationTests(TestCase):
+    """Проход по всем страницам курсора возвращает каждый рецепт
+    ровно один раз, даже если даты публикации различаются меньше
+    чем на миллисекунду."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        author = create_user('author')
+        cls.recipe_ids = []
+        for number in range(23):
+            recipe = create_recipe(author, name=f'Рецепт {number}')
+            # По четыре рецепта в одной миллисекунде, и пары с
+            # одинаковой датой, которые различает только id.
+            pub_date = BASE_DATE + timedelta(
+                milliseconds=number // 4, microseconds=number % 4 // 2 * 10
+            )
+            Recipe.objects.filter(pk=recipe.pk).update(pub_date=pub_date)
+            cls.recipe_ids.append(recipe.pk)
+        Subscription.objects.subscribe(cls.user.id, author.id)
+        TimelineEntry.objects.rebuild()
+
+    def setUp(self):
+        self.client = auth_client(self.user)
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_recipes_cursor_returns_every_recipe_once(self):
+        ids = self.walk('/api/recipes/?cursor=&limit=3')
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), set(self.recipe_ids))
+        self.assertEqual(ids, list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True)))
+
+    def test_feed_cursor_returns_every_recipe_once(self):
+        ids = self.walk('/api/recipes/feed/?limit=3')
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), set(self.recipe_ids))
+
+    def test_malformed_cursor_values_are_not_found(self):
+        for values in (
+            ['x', 1],
+            ['2024-01-01T00:00:00+00:00', {'a': 1}],
+            ['2024-01-01T00:00:00+00:00', None],
+            [[], 'y'],
+        ):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(values).encode()
+            ).decode()
+            for url in ('/api/recipes/', '/api/recipes/feed/'):
+                with self.subTest(values=values, url=url):
+                    response = self.client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 404)
+
+
+class TimelineTiesTests(TestCase):
+    """Записи ленты с одинаковой датой публикации различает только
+    recipe_id, и курсор не теряет и не повторяет их."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        authors = [create_user(f'author{number}') for number in range(2)]
+        for number in range(9):
+            recipe = create_recipe(
+                authors[number % 2], name=f'Рецепт {number}'
+            )
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=BASE_DATE + timedelta(seconds=number // 5)
+            )
+        for author in authors:
+            Subscription.objects.subscribe(cls.user.id, author.id)
+        TimelineEntry.objects.rebuild()
+
+    def test_feed_cursor_pages_through_equal_dates(self):
+        client = auth_client(self.user)
+        ids = []
+        url = '/api/recipes/feed/?limit=2'
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        self.assertEqual(ids, list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True)))
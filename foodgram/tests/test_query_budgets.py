@@ -0,0 +1,79 @@
+from api.views import RecipeViewSet
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Favorite, ShoppingСart
+from recipes.similarity import build_similar_recipes
+from users.models import Subscription
+
+from .utils import (auth_client, create_ingredients, create_recipe,
+                    create_tags, create_user)
+
+
+@override_settings(QUERY_BUDGET_CHECK='strict')
+class RecipeQueryBudgetTests(TestCase):
+    """Число SQL-запросов действий RecipeViewSet не выходит за
+    query_budget и не растет с числом рецептов на странице."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('reader')
+        author = create_user('author')
+        tags = create_tags()
+        ingredients = create_ingredients()
+        cls.recipes = [
+            create_recipe(
+                author,
+                name=f'Суп {number}',
+                tags=tags[number % 3:],
+                ingredients=ingredients[number % 5:number % 5 + 4],
+            )
+            for number in range(12)
+        ]
+        Subscription.objects.subscribe(cls.user.id, author.id)
+        for recipe in cls.recipes[:6]:
+            Favorite.objects.add(cls.user.id, recipe.id)
+            ShoppingСart.objects.add(cls.user.id, recipe.id)
+        build_similar_recipes()
+
+    def setUp(self):
+        self.client = auth_client(self.user)
+        recipe_id = self.recipes[0].id
+        self.urls = {
+            'list': '/api/recipes/?tags=tag0&is_favorited=1',
+            'retrieve': f'/api/recipes/{recipe_id}/',
+            'feed': '/api/recipes/feed/',
+            'similar': f'/api/recipes/{recipe_id}/similar/',
+        }
+
+    def count_queries(self, url):
+        # Без кеша токена: бюджет рассчитан на худший случай.
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return len(queries)
+
+    def test_every_budgeted_action_is_checked(self):
+        self.assertEqual(set(self.urls), set(RecipeViewSet.query_budget))
+
+    def test_actions_stay_within_budget(self):
+        for action, url in self.urls.items():
+            with self.subTest(action=action):
+                self.assertLessEqual(
+                    self.count_queries(url),
+                    RecipeViewSet.query_budget[action]
+                )
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        self.assertEqual(
+            self.count_queries('/api/recipes/?limit=2'),
+            self.count_queries('/api/recipes/?limit=12'),
+        )
+
+    def test_feed_queries_do_not_grow_with_page_size(self):
+        self.assertEqual(
+            self.count_queries('/api/recipes/feed/?limit=2'),
+            self.count_queries('/api/recipes/feed/?limit=12'),
+        )
@@ -0,0 +1,97 @@
+import base64
+from io import BytesIO
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from recipes.models import Recipe
+
+from .utils import (TempMediaMixin, auth_client, create_ingredients,
+                    create_recipe, create_tags, create_user)
+
+
+def image_data(content=None):
+    if content is None:
+        buffer = BytesIO()
+        Image.new('RGB', (40, 30), (200, 60, 60)).save(buffer, 'PNG')
+        content = buffer.getvalue()
+    return 'data:image/png;base64,' + base64.b64encode(content).decode()
+
+
+class RecipeWriteTests(TempMediaMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('author')
+        cls.tags = create_tags()
+        cls.ingredients = create_ingredients(30)
+
+    def setUp(self):
+        super().setUp()
+        self.client = auth_client(self.user)
+
+    def payload(self, **fields):
+        payload = {
+            'name': 'Суп',
+            'text': 'Сварить',
+            'cooking_time': 10,
+            'image': image_data(),
+            'tags': [tag.id for tag in self.tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients
+            ],
+        }
+        payload.update(fields)
+        return payload
+
+    def test_create_accepts_image(self):
+        response = self.client.post(
+            '/api/recipes/', self.payload(), format='json'
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_create_rejects_data_that_is_not_an_image(self):
+        for image in (image_data(b'garbage'), 'data:image/png;base64,!'):
+            with self.subTest(image=image):
+                response = self.client.post(
+                    '/api/recipes/', self.payload(image=image), format='json'
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('image', response.data)
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_patch_changes_one_amount_in_few_queries(self):
+        recipe = create_recipe(
+            self.user, 'Суп', self.tags, self.ingredients
+        )
+        payload = self.payload()
+        del payload['image']
+        payload['ingredients'][0]['amount'] = 25
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/', payload, format='json'
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        # Токен, рецепт с автором, теги, ингредиенты, уникальность
+        # названия, запись изменений со SAVEPOINT, связи пользователя.
+        # На SQLite еще три запроса обновляют полнотекстовый индекс.
+        self.assertLessEqual(len(queries), 16)
+        self.assertEqual(
+            [tag['id'] for tag in response.data['tags']],
+            [tag.id for tag in self.tags]
+        )
+        ingredients = response.data['ingredients']
+        self.assertEqual(len(ingredients), 30)
+        self.assertEqual(ingredients[0]['name'], self.ingredients[0].name)
+        self.assertEqual(ingredients[0]['amount'], '25')
+        self.assertEqual(
+            recipe.recipeingredient_set.get(
+                ingredient=self.ingredients[0]
+            ).amount,
+            25
+        )
+        self.assertFalse(response.data['is_favorited'])
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import TestCase
+from recipes.models import Ingredient
+from recipes.versions import INGREDIENTS, bump_data_version
+from rest_framework.test import APIClient
+
+from .utils import create_ingredients
+
+
+class IngredientCacheTests(TestCase):
+    """Поиск ингредиентов по имени отдает ETag и 304, пока
+    справочник не изменился."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_ingredients()
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_name_search_is_conditional(self):
+        for url in (
+            '/api/ingredients/?name=Ингр',
+            '/api/ingredients/?name=Ингридиент&fuzzy=true',
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.data)
+                etag = response['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+
+    def test_name_search_changes_with_catalog(self):
+        url = '/api/ingredients/?name=Ингр'
+        response = self.client.get(url)
+        etag = response['ETag']
+        Ingredient.objects.create(name='Ингр новый', measurement_unit='г')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(
+            'Ингр новый', [item['name'] for item in response.data]
+        )
+
+    def test_version_is_shared_through_the_database(self):
+        url = '/api/ingredients/?name=Ингр'
+        etag = self.client.get(url)['ETag']
+        # Процесс с другим кешем видит ту же версию справочника.
+        cache.clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        bump_data_version(INGREDIENTS)
+        cache.clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since_does_not_give_stale_304(self):
+        url = '/api/ingredients/?name=Ингр'
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        Ingredient.objects.create(name='Ингр новый', measurement_unit='г')
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT'
+        )
+        self.assertEqual(response.status_code, 200)
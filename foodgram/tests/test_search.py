@@ -0,0 +1,33 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from .utils import create_recipe, create_user
+
+
+class RecipeSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        for name, text in (
+            ('Суп гороховый', 'Суп на копченостях'),
+            ('Борщ', 'Подавать как суп со сметаной'),
+            ('Салат', 'Нарезать овощи'),
+            ('Салат к супу', 'Нарезать овощи'),
+        ):
+            recipe = create_recipe(author, name=name)
+            recipe.text = text
+            recipe.save()
+
+    def names(self, url):
+        response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def test_cursor_keeps_relevance_order(self):
+        expected = self.names('/api/recipes/?search=суп')
+        self.assertEqual(expected[0], 'Суп гороховый')
+        self.assertNotIn('Салат', expected)
+        self.assertEqual(
+            self.names('/api/recipes/?search=суп&cursor='), expected
+        )
@@ -0,0 +1,57 @@
+from django.test import TestCase
+from recipes.models import RecipeIngredient, SimilarRecipe
+from recipes.similarity import build_similar_recipes, update_similar_recipes
+
+from .utils import create_ingredients, create_recipe, create_user
+
+
+class UpdateSimilarRecipesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        cls.ingredients = create_ingredients(5)
+        first, second, third, fourth, fifth = cls.ingredients
+        cls.soup = create_recipe(author, 'Суп', (), [first, second])
+        cls.stew = create_recipe(author, 'Рагу', (), [first, second, third])
+        cls.salad = create_recipe(author, 'Салат', (), [fourth, fifth])
+        cls.sauce = create_recipe(author, 'Соус', (), [fourth])
+        build_similar_recipes()
+
+    def similar(self, recipe):
+        return dict(SimilarRecipe.objects.filter(
+            recipe=recipe
+        ).values_list('similar_id', 'score'))
+
+    def test_changed_ingredients_update_own_and_other_lists(self):
+        self.assertIn(self.stew.pk, self.similar(self.soup))
+        self.assertIn(self.soup.pk, self.similar(self.stew))
+        self.assertNotIn(self.soup.pk, self.similar(self.salad))
+        RecipeIngredient.objects.filter(recipe=self.soup).delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=self.soup, ingredient=ingredient, amount=5)
+            for ingredient in self.ingredients[3:]
+        )
+        update_similar_recipes(self.soup.pk)
+        own = self.similar(self.soup)
+        self.assertEqual(set(own), {self.salad.pk, self.sauce.pk})
+        # Рецепт убран из списка, где сходство упало до нуля,
+        # и добавлен в списки новых соседей.
+        self.assertNotIn(self.soup.pk, self.similar(self.stew))
+        self.assertIn(self.soup.pk, self.similar(self.salad))
+        self.assertIn(self.soup.pk, self.similar(self.sauce))
+        incremental = {
+            recipe.pk: self.similar(recipe)
+            for recipe in (self.soup, self.salad, self.sauce)
+        }
+        # Сходство с измененным рецептом совпадает с полной пересборкой.
+        # Пары без него не пересчитываются, хотя веса ингредиентов
+        # сдвинулись.
+        build_similar_recipes()
+        for recipe_id, neighbours in incremental.items():
+            rebuilt = self.similar(recipe_id)
+            for similar_id, score in neighbours.items():
+                if self.soup.pk not in (recipe_id, similar_id):
+                    continue
+                with self.subTest(recipe=recipe_id, similar=similar_id):
+                    self.assertAlmostEqual(score, rebuilt[similar_id])
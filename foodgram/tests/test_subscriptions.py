@@ -0,0 +1,59 @@
+import threading
+
+from django.db import connection
+from django.test import TransactionTestCase
+from users.models import Subscription
+
+from .utils import auth_client, create_user
+
+THREADS = 8
+
+
+class ParallelSubscribeTests(TransactionTestCase):
+    """Параллельные подписки на одного автора не создают дублей
+    и не превращаются в ошибки 500."""
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest(
+                'SQLite в памяти блокирует таблицы при параллельной записи'
+            )
+        self.subscriber = create_user('subscriber')
+        self.author = create_user('author')
+        self.url = f'/api/users/{self.author.id}/subscribe/'
+
+    def run_in_parallel(self, method):
+        barrier = threading.Barrier(THREADS)
+        statuses = []
+
+        def send():
+            client = auth_client(self.subscriber)
+            barrier.wait()
+            try:
+                statuses.append(getattr(client, method)(self.url).status_code)
+            except Exception:
+                # Тестовый клиент пробрасывает исключение вместо 500.
+                statuses.append(500)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sorted(statuses)
+
+    def test_parallel_subscribe_and_unsubscribe(self):
+        self.assertEqual(
+            self.run_in_parallel('post'), [201] + [400] * (THREADS - 1)
+        )
+        self.assertEqual(Subscription.objects.count(), 1)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 1)
+        self.assertEqual(
+            self.run_in_parallel('delete'), [204] + [400] * (THREADS - 1)
+        )
+        self.assertFalse(Subscription.objects.exists())
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 0)
@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+
+from django.test import TestCase, override_settings
+from recipes.models import Recipe, TimelineEntry
+from users.models import Subscription
+
+from .utils import create_recipe, create_user
+
+BASE_DATE = datetime(2024, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+@override_settings(FEED_BACKFILL_LIMIT=2)
+class TimelineTests(TestCase):
+
+    def setUp(self):
+        self.reader = create_user('reader')
+        self.author = create_user('author')
+        self.published = 0
+
+    def publish(self, count=1):
+        recipes = []
+        for _ in range(count):
+            recipe = create_recipe(
+                self.author, name=f'Рецепт {self.published}'
+            )
+            Recipe.objects.filter(pk=recipe.pk).update(
+                pub_date=BASE_DATE + timedelta(minutes=self.published)
+            )
+            self.published += 1
+            recipes.append(recipe.pk)
+        return recipes
+
+    def feed(self):
+        return list(TimelineEntry.objects.filter(
+            user=self.reader
+        ).order_by('-pub_date').values_list('recipe_id', flat=True))
+
+    def test_subscribe_backfills_latest_recipes(self):
+        recipes = self.publish(3)
+        Subscription.objects.subscribe(self.reader.id, self.author.id)
+        self.assertEqual(self.feed(), recipes[:0:-1])
+
+    def test_unsubscribe_prunes_author(self):
+        other = create_user('other')
+        other_recipe = create_recipe(other, name='Чужой рецепт')
+        self.publish(2)
+        Subscription.objects.subscribe(self.reader.id, self.author.id)
+        Subscription.objects.subscribe(self.reader.id, other.id)
+        Subscription.objects.unsubscribe(self.reader.id, self.author.id)
+        self.assertEqual(self.feed(), [other_recipe.pk])
+
+    def test_new_recipe_is_fanned_out_to_subscribers(self):
+        Subscription.objects.subscribe(self.reader.id, self.author.id)
+        recipe_id, = self.publish()
+        self.assertEqual(TimelineEntry.objects.fan_out(recipe_id), 1)
+        self.assertEqual(self.feed(), [recipe_id])
+
+    @override_settings(FEED_FANOUT_MAX_SUBSCRIBERS=0)
+    def test_popular_author_is_pulled_with_limit(self):
+        old = self.publish()
+        Subscription.objects.subscribe(self.reader.id, self.author.id)
+        self.assertEqual(self.feed(), old)
+        new = self.publish(4)
+        for recipe_id in new:
+            self.assertEqual(TimelineEntry.objects.fan_out(recipe_id), 0)
+        self.assertEqual(self.feed(), old)
+        TimelineEntry.objects.pull(self.reader.id)
+        self.assertEqual(self.feed(), new[:1:-1] + old)
+        TimelineEntry.objects.pull(self.reader.id)
+        self.assertEqual(self.feed(), new[:1:-1] + old)
@@ -0,0 +1,73 @@
+from django.test import TestCase
+from recipes.models import Recipe, ShoppingListItem, ShoppingСart
+
+from .utils import auth_client, create_ingredients, create_recipe, create_user
+
+
+class ShoppingCartBatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('buyer')
+        cls.ingredients = create_ingredients(2)
+        cls.recipes = [
+            create_recipe(cls.user, f'Рецепт {number}', (), cls.ingredients)
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        self.client = auth_client(self.user)
+
+    def batch(self, method, recipe_ids):
+        response = getattr(self.client, method)(
+            '/api/recipes/shopping_cart/', {'recipes': recipe_ids},
+            format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        return [result['status'] for result in response.data['results']]
+
+    def assert_state(self, carts_count, amount):
+        self.assertEqual(
+            set(Recipe.objects.values_list('carts_count', flat=True)),
+            {carts_count}
+        )
+        self.assertEqual(
+            set(ShoppingListItem.objects.filter(
+                user=self.user
+            ).values_list('amount', flat=True)),
+            {amount} if amount else set()
+        )
+
+    def test_statuses_follow_rows_actually_changed(self):
+        ids = [recipe.id for recipe in self.recipes]
+        self.assertEqual(
+            self.batch('post', ids + [0]),
+            ['added', 'added', 'added', 'not_found']
+        )
+        self.assertEqual(
+            self.batch('post', ids), ['already_added'] * 3
+        )
+        self.assert_state(carts_count=1, amount=30)
+        self.assertEqual(
+            self.batch('delete', ids + [0]),
+            ['removed', 'removed', 'removed', 'not_found']
+        )
+        self.assertEqual(self.batch('delete', ids), ['not_added'] * 3)
+        self.assert_state(carts_count=0, amount=0)
+
+    def test_repeated_insert_applies_hooks_once(self):
+        ids = [recipe.id for recipe in self.recipes]
+        self.assertEqual(
+            ShoppingСart.objects.add_many(self.user.id, ids), set(ids)
+        )
+        self.assertEqual(
+            ShoppingСart.objects.add_many(self.user.id, ids), set()
+        )
+        self.assert_state(carts_count=1, amount=30)
+        self.assertEqual(
+            ShoppingСart.objects.remove_many(self.user.id, ids), set(ids)
+        )
+        self.assertEqual(
+            ShoppingСart.objects.remove_many(self.user.id, ids), set()
+        )
+        self.assert_state(carts_count=0, amount=0)
@@ -0,0 +1,75 @@
+import shutil
+import tempfile
+
+from django.test import override_settings
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import User
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        first_name='Имя',
+        last_name='Фамилия',
+        password='password-12345',
+    )
+
+
+def auth_client(user):
+    token, _ = Token.objects.get_or_create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def create_tags(count=3):
+    return [
+        Tag.objects.create(
+            name=f'Тег {number}', colour=f'#00000{number}', slug=f'tag{number}'
+        )
+        for number in range(count)
+    ]
+
+
+def create_ingredients(count=10):
+    return [
+        Ingredient.objects.create(
+            name=f'Ингредиент {number}', measurement_unit='г'
+        )
+        for number in range(count)
+    ]
+
+
+def create_recipe(author, name='Рецепт', tags=(), ingredients=()):
+    recipe = Recipe.objects.create(
+        author=author,
+        name=name,
+        text='Нарезать и перемешать',
+        image='recipes/test.png',
+        cooking_time=10,
+    )
+    recipe.tags.set(tags)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=10)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+class TempMediaMixin:
+    """Файлы теста пишутся во временный MEDIA_ROOT, который удаляется
+    после теста."""
+
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.media_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.media_override.enable()
+
+    def tearDown(self):
+        self.media_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
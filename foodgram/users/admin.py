@@ -4,10 +4,21 @@ from .models import Subscription, User
 
 
 class UserAdmin(admin.ModelAdmin):
-    list_display = ('id', 'username', 'email')
-    list_filter = ('username', 'email')
-    search_fields = ('username', 'email')
+    list_display = (
+        'id', 'username', 'email', 'recipes_count', 'subscribers_count'
+    )
+    list_filter = ('is_staff', 'is_active')
+    search_fields = ('^username', '^email')
+    show_full_result_count = False
+
+
+class SubscriptionAdmin(admin.ModelAdmin):
+    list_display = ('subscriber', 'author')
+    list_select_related = ('subscriber', 'author')
+    autocomplete_fields = ('subscriber', 'author')
+    search_fields = ('^subscriber__username', '^author__username')
+    show_full_result_count = False
 
 
 admin.site.register(User, UserAdmin)
-admin.site.register(Subscription)
+admin.site.register(Subscription, SubscriptionAdmin)
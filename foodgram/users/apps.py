@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class UserConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        from . import signals  # noqa: F401
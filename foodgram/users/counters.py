@@ -0,0 +1,45 @@
+from collections import defaultdict
+
+from django.db.models import F
+
+# Не больше стольких ключей в одном UPDATE ... WHERE id IN (...).
+BATCH_SIZE = 500
+
+
+def adjust_counters(model, field, deltas):
+    """Атомарно прибавляет deltas {pk: изменение} к счетчику field.
+
+    Объекты с одинаковым изменением обновляются одним запросом.
+    """
+    pks_by_delta = defaultdict(list)
+    for pk, delta in deltas.items():
+        if delta:
+            pks_by_delta[delta].append(pk)
+    for delta, pks in pks_by_delta.items():
+        for start in range(0, len(pks), BATCH_SIZE):
+            model.objects.filter(
+                pk__in=pks[start:start + BATCH_SIZE]
+            ).update(**{field: F(field) + delta})
+
+
+class CountersMixin:
+    """Модель со счетчиками, которые меняет только adjust_counters.
+
+    Сохранение существующей строки не пишет поля counter_fields:
+    иначе значения из устаревшего экземпляра затрут изменения,
+    сделанные через F() после его загрузки.
+    """
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not self._state.adding
+            and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            skipped = set(self.counter_fields) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.attname not in skipped
+            ]
+        super().save(*args, **kwargs)
@@ -0,0 +1,39 @@
+# Generated by Django 2.2.19 on 2026-10-17 08:40
+
+from django.db import migrations
+
+# Поиск '^поле' в админке - это istartswith, который в PostgreSQL
+# выполняется как UPPER(поле::text) LIKE 'X%'. Такой запрос идет
+# только по индексу на то же выражение с text_pattern_ops.
+INDEXES = {
+    'users_user_username_upper_like': 'username',
+    'users_user_email_upper_like': 'email',
+}
+
+
+def create_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, column in INDEXES.items():
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON users_user '
+            f'((UPPER({column}::text)) text_pattern_ops)'
+        )
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name in INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_prefix_indexes, drop_prefix_indexes),
+    ]
@@ -1,14 +1,30 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connection, models, transaction
 from django.db.models import CheckConstraint, F, Q, UniqueConstraint
+from django.dispatch import Signal
 
+from .counters import CountersMixin, adjust_counters
 
-class User(AbstractUser):
+# Отправляются при любой подписке и отписке, в том числе из
+# SubscriptionManager, который обходит сигналы модели.
+subscribed = Signal(providing_args=['subscriber_id', 'author_id'])
+unsubscribed = Signal(providing_args=['subscriber_id', 'author_id'])
+
+
+class User(CountersMixin, AbstractUser):
     email = models.EmailField('Почта пользователя', unique=True)
     username = models.CharField(db_index=True, max_length=150, unique=True)
     first_name = models.CharField('Имя', max_length=150)
     last_name = models.CharField('Фамилия', max_length=150)
     password = models.CharField('Пароль', max_length=150)
+    recipes_count = models.IntegerField(
+        'Число рецептов', default=0, editable=False
+    )
+    subscribers_count = models.IntegerField(
+        'Число подписчиков', default=0, editable=False
+    )
+
+    counter_fields = ('recipes_count', 'subscribers_count')
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
@@ -22,6 +38,57 @@ class User(AbstractUser):
         return self.username
 
 
+class SubscriptionManager(models.Manager):
+    """Подписка и отписка одним SQL-оператором без сигналов модели.
+
+    Повторы и несуществующих авторов отсекают ограничения базы
+    и условие вставки, поэтому параллельные запросы не создают дублей.
+    Удачная подписка в той же транзакции обновляет счетчик подписчиков
+    и добавляет рецепты автора в ленту: три оператора вместо одного.
+    """
+
+    def subscribe(self, subscriber_id, author_id):
+        """Возвращает False, если подписка уже есть или автора нет."""
+        opts = self.model._meta
+        quote = connection.ops.quote_name
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO {table} ({subscriber}, {author}) '
+                'SELECT %s, {user_pk} FROM {users} WHERE {user_pk} = %s '
+                'ON CONFLICT DO NOTHING'.format(
+                    table=quote(opts.db_table),
+                    subscriber=quote(opts.get_field('subscriber').column),
+                    author=quote(opts.get_field('author').column),
+                    users=quote(User._meta.db_table),
+                    user_pk=quote(User._meta.pk.column),
+                ),
+                [subscriber_id, author_id]
+            )
+            created = cursor.rowcount > 0
+            if created:
+                self.model.subscription_added(subscriber_id, author_id)
+        return created
+
+    def unsubscribe(self, subscriber_id, author_id):
+        """Возвращает False, если подписки не было."""
+        opts = self.model._meta
+        quote = connection.ops.quote_name
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM {table} '
+                'WHERE {subscriber} = %s AND {author} = %s'.format(
+                    table=quote(opts.db_table),
+                    subscriber=quote(opts.get_field('subscriber').column),
+                    author=quote(opts.get_field('author').column),
+                ),
+                [subscriber_id, author_id]
+            )
+            deleted = cursor.rowcount > 0
+            if deleted:
+                self.model.subscription_removed(subscriber_id, author_id)
+        return deleted
+
+
 class Subscription(models.Model):
     subscriber = models.ForeignKey(
         User,
@@ -50,5 +117,21 @@ class Subscription(models.Model):
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
 
+    objects = SubscriptionManager()
+
     def __str__(self):
         return f'{self.subscriber} подписан на {self.author}'
+
+    @classmethod
+    def subscription_added(cls, subscriber_id, author_id):
+        adjust_counters(User, 'subscribers_count', {author_id: 1})
+        subscribed.send(
+            sender=cls, subscriber_id=subscriber_id, author_id=author_id
+        )
+
+    @classmethod
+    def subscription_removed(cls, subscriber_id, author_id):
+        adjust_counters(User, 'subscribers_count', {author_id: -1})
+        unsubscribed.send(
+            sender=cls, subscriber_id=subscriber_id, author_id=author_id
+        )